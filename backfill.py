@@ -0,0 +1,206 @@
+import os
+import glob
+import datetime
+import argparse
+import concurrent.futures
+
+import numpy as np
+
+from recording_file import RecordingSet, NoteFeatures, Data
+from ingest_journal import IngestJournal
+from seen_replays import SeenReplays
+from map_index import MapIndex
+from beatmap_cache import BeatmapCache
+from replay_processor import ReplayProcessor
+
+
+
+# Set up in each worker process by `_init_worker`
+_processor = None
+
+
+def _init_worker(osu_path, map_index_pathname, cache_dir):
+    global _processor
+    _processor = ReplayProcessor(osu_path, MapIndex(map_index_pathname), BeatmapCache(cache_dir))
+
+
+def _process_replay(replay_path):
+    '''
+    Returns the replay's play as a dict of `RecordingSet.append` arguments, or None
+    '''
+    try: result = _processor.process(replay_path, timestamp=os.path.getmtime(replay_path))
+    except Exception as e:
+        print(f'Error processing "{replay_path}": {e}')
+        return None
+
+    if isinstance(result, type(None)):
+        return None
+
+    data, title = result
+    if data.shape[0] == 0:
+        return None
+
+    return dict(rows=Data.to_records(data), features=NoteFeatures.get_features(data), **Data.get_play_info(data))
+
+
+
+class Backfill():
+    '''
+    Records replays that were saved while the recorder was not running.
+
+    Every mania replay in `{osu_path}/data/r` that is not in `seen_replays` is run
+    through the same pipeline as live replays, spread over a pool of processes. Plays
+    are appended to the dataset in batches and are timestamped with the replay file's
+    modification time, so they fall in with the other plays in the order they were played.
+
+    Replays recorded before there were `seen_replays` aren't in it. A play is taken as
+    already recorded if the dataset has a play of the same map and mods within
+    `RECORDED_TIME` of the replay's modification time; its replay is marked as seen.
+    '''
+
+    BATCH_SIZE = 64
+
+    # Seconds between osu! saving a replay and the recorder timestamping its play
+    RECORDED_TIME = 10
+
+    # First byte of an .osr is the gamemode
+    GAMEMODE_MANIA = 3
+
+    def __init__(self, osu_path, map_index_pathname='data/maps.db', cache_dir='data/beatmap_cache', num_workers=None):
+        self.osu_path           = osu_path
+        self.map_index_pathname = map_index_pathname
+        self.cache_dir          = cache_dir
+        self.num_workers        = num_workers
+
+
+    def find_replays(self, seen_replays):
+        '''
+        Returns (replay path, content hash) of the mania replays not in `seen_replays`
+        '''
+        replays = []
+
+        for replay_path in sorted(glob.glob(f'{self.osu_path}/data/r/*.osr')):
+            with open(replay_path, 'rb') as f:
+                if f.read(1) != bytes([ Backfill.GAMEMODE_MANIA ]):
+                    continue
+
+            replay_hash = IngestJournal.get_file_hash(replay_path)
+            if replay_hash in seen_replays:
+                continue
+
+            replays.append((replay_path, replay_hash))
+
+        return replays
+
+
+    def run(self, dataset, seen_replays, progress=None):
+        '''
+        Returns the number of replays recorded, the number found already recorded and the
+        number that could not be. `progress`, if given, is called with (replays done, total
+        replays) after each batch is written.
+        '''
+        replays  = self.find_replays(seen_replays)
+        recorded = Backfill.__get_recorded_times(dataset)
+
+        num_recorded = 0
+        num_found    = 0
+        num_done     = 0
+
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers = self.num_workers,
+            initializer = _init_worker,
+            initargs    = (self.osu_path, self.map_index_pathname, self.cache_dir)
+        )
+
+        with executor:
+            # Results come back in order while the pool keeps working on later replays
+            plays = executor.map(_process_replay, [ replay_path for replay_path, replay_hash in replays ], chunksize=4)
+            batch = []
+            found = []
+
+            for play, (replay_path, replay_hash) in zip(plays, replays):
+                num_done += 1
+                if not isinstance(play, type(None)):
+                    if Backfill.__is_recorded(recorded, play):
+                        found.append(replay_hash)
+                    else:
+                        batch.append((play, replay_hash))
+
+                if (num_done % Backfill.BATCH_SIZE != 0) and (num_done < len(replays)):
+                    continue
+
+                if len(batch) != 0:
+                    # Plays go in before they are marked as seen, so an interrupted backfill
+                    # can at worst record a batch twice, never lose it
+                    dataset.append_many([ play for play, replay_hash in batch ])
+                    seen_replays.add_many([ replay_hash for play, replay_hash in batch ])
+
+                    num_recorded += len(batch)
+                    batch = []
+
+                if len(found) != 0:
+                    seen_replays.add_many(found)
+                    num_found += len(found)
+                    found = []
+
+                if not isinstance(progress, type(None)):
+                    progress(num_done, len(replays))
+
+        return num_recorded, num_found, len(replays) - num_recorded - num_found
+
+
+    @staticmethod
+    def __get_recorded_times(dataset):
+        # map key -> sorted timestamps of the plays of that map in the dataset
+        map_keys   = np.concatenate([ data_file.map_keys for data_file in dataset.data_files ] + [ np.empty(0, dtype=np.uint64) ])
+        timestamps = np.concatenate([ data_file.directory['timestamp'] for data_file in dataset.data_files ] + [ np.empty(0) ])
+
+        order = np.lexsort((timestamps, map_keys))
+        map_keys, starts = np.unique(map_keys[order], return_index=True)
+
+        return dict(zip(map_keys.tolist(), np.split(timestamps[order], starts[1:])))
+
+
+    @staticmethod
+    def __is_recorded(recorded, play):
+        timestamps = recorded.get(int(play['map_hash']) | int(play['mods']), None)
+        if isinstance(timestamps, type(None)):
+            return False
+
+        # Nearest recorded play on either side of the replay's time
+        idx = np.searchsorted(timestamps, play['timestamp'])
+        near = timestamps[max(idx - 1, 0) : idx + 1]
+        return bool(np.any(np.abs(near - play['timestamp']) <= Backfill.RECORDED_TIME))
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Records the mania replays in osu!\'s data/r folder that are not recorded yet')
+    parser.add_argument('osu_path', help='osu! folder')
+    parser.add_argument('-o', '--output', default=None, help='recording to write to (default: a new recording in data)')
+    parser.add_argument('-r', '--recordings', nargs='*', default=[ 'data' ], help='recordings, or folders of them, that replays may already be in (default: data)')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='worker processes (default: number of cores)')
+    args = parser.parse_args()
+
+    os.makedirs('data', exist_ok=True)
+
+    output = args.output
+    if isinstance(output, type(None)):
+        date = datetime.datetime.now()
+        output = f'data/recording_v4_backfill_{date.year}_{date.month}_{date.day}_{date.hour}_{date.minute}_{date.second}.rec'
+
+    map_index = MapIndex('data/maps.db')
+    map_index.sync(f'{args.osu_path}/osu!.db')
+    map_index.close()
+
+    seen_replays = SeenReplays('data/seen_replays.txt')
+    dataset      = RecordingSet.open(args.recordings, write_pathname=output)
+
+    backfill = Backfill(args.osu_path, num_workers=args.workers)
+
+    try:
+        num_recorded, num_found, num_failed = backfill.run(dataset, seen_replays, progress=lambda done, total: print(f'{done}/{total} replays'))
+        print(f'Recorded {num_recorded} replays into "{output}" ({num_found} were already recorded, {num_failed} could not be recorded)')
+    finally:
+        dataset.close()
+        seen_replays.close()
@@ -0,0 +1,123 @@
+import os
+import json
+import collections
+
+import numpy as np
+
+
+
+class BeatmapCache():
+    '''
+    Cache of what the recorder needs from a beatmap - its action data and a few metadata
+    fields (cs, beatmap_id, name) - keyed by the beatmap's md5.
+
+    The most recently used entries are kept in memory. All entries are also saved in
+    `cache_dir`, so they outlive the app. Both are LRU bounded. An entry is only used
+    while the .osu file's size and modification time are the same as when it was cached.
+    '''
+
+    def __init__(self, cache_dir, max_memory=32, max_disk=1024):
+        self.cache_dir  = cache_dir
+        self.max_memory = max_memory
+        self.max_disk   = max_disk
+
+        self.__entries = collections.OrderedDict()
+        os.makedirs(cache_dir, exist_ok=True)
+
+
+    @staticmethod
+    def __get_stamp(beatmap_pathname):
+        stat = os.stat(beatmap_pathname)
+        return [ stat.st_mtime_ns, stat.st_size ]
+
+
+    def __get_pathname(self, md5):
+        return f'{self.cache_dir}/{md5}.npz'
+
+
+    def get(self, md5, beatmap_pathname):
+        '''
+        Returns (action data, metadata) of the beatmap, or None if it is not cached. The
+        action data is a copy, so it can be modified.
+        '''
+        try: stamp = BeatmapCache.__get_stamp(beatmap_pathname)
+        except FileNotFoundError:
+            return None
+
+        entry = self.__entries.get(md5, None)
+        if isinstance(entry, type(None)):
+            entry = self.__load(md5)
+
+        if isinstance(entry, type(None)):
+            return None
+
+        map_data, meta = entry
+        if meta['stamp'] != stamp:
+            # .osu changed since it was cached
+            self.__remove(md5)
+            return None
+
+        self.__remember(md5, entry)
+
+        # The file's modification time is its last use, for evicting from disk
+        try: os.utime(self.__get_pathname(md5))
+        except FileNotFoundError:
+            pass
+
+        return map_data.copy(), meta
+
+
+    def put(self, md5, beatmap_pathname, map_data, meta):
+        meta = dict(meta, stamp=BeatmapCache.__get_stamp(beatmap_pathname))
+        entry = (np.array(map_data), meta)
+
+        # Several processes can share the cache folder
+        file_pathname = self.__get_pathname(md5)
+        tmp_pathname  = f'{file_pathname}.{os.getpid()}.tmp'
+
+        with open(tmp_pathname, 'wb') as f:
+            np.savez(f, map_data=entry[0], meta=np.array(json.dumps(meta)))
+
+        os.replace(tmp_pathname, file_pathname)
+
+        self.__remember(md5, entry)
+        self.__evict_disk()
+
+
+    def __load(self, md5):
+        file_pathname = self.__get_pathname(md5)
+
+        try:
+            with np.load(file_pathname) as f:
+                entry = (f['map_data'], json.loads(str(f['meta'])))
+        except (OSError, ValueError, KeyError):
+            # Missing or unreadable
+            return None
+
+        return entry
+
+
+    def __remember(self, md5, entry):
+        self.__entries[md5] = entry
+        self.__entries.move_to_end(md5)
+
+        while len(self.__entries) > self.max_memory:
+            self.__entries.popitem(last=False)
+
+
+    def __remove(self, md5):
+        self.__entries.pop(md5, None)
+
+        try: os.remove(self.__get_pathname(md5))
+        except FileNotFoundError:
+            pass
+
+
+    def __evict_disk(self):
+        entries = [ entry for entry in os.scandir(self.cache_dir) if entry.name.endswith('.npz') ]
+        if len(entries) <= self.max_disk:
+            return
+
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_disk]:
+            self.__remove(entry.name[:-len('.npz')])
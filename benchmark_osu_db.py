@@ -0,0 +1,115 @@
+import time
+import argparse
+
+from osu_db_reader.buffer import ReadBuffer
+from osu_db_reader.osu_db_reader import OsuDbReader
+
+
+
+def read_buffered(filename):
+    '''
+    The field by field ReadBuffer parser OsuDbReader used to be, for comparison
+    '''
+    data = []
+
+    with open(filename, 'rb') as db:
+        version = ReadBuffer.read_uint(db)
+        folder_count = ReadBuffer.read_uint(db)
+        account_unlocked = ReadBuffer.read_bool(db)
+        ReadBuffer.read_uint(db)
+        ReadBuffer.read_uint(db)
+        name = ReadBuffer.read_string(db)
+        num_beatmaps = ReadBuffer.read_uint(db)
+
+        for _ in range(num_beatmaps):
+            for _ in range(7):
+                ReadBuffer.read_string(db)
+
+            md5_hash = ReadBuffer.read_string(db)
+            map_file = ReadBuffer.read_string(db)
+            ReadBuffer.read_ubyte(db)
+            ReadBuffer.read_ushort(db)
+            ReadBuffer.read_ushort(db)
+            ReadBuffer.read_ushort(db)
+            last_modified = ReadBuffer.read_ulong(db)
+            ReadBuffer.read_float(db)
+            ReadBuffer.read_float(db)
+            ReadBuffer.read_float(db)
+            ReadBuffer.read_float(db)
+            ReadBuffer.read_double(db)
+
+            for _ in range(4):
+                for _ in range(ReadBuffer.read_uint(db)):
+                    ReadBuffer.read_int_double(db)
+
+            ReadBuffer.read_uint(db)
+            ReadBuffer.read_uint(db)
+            ReadBuffer.read_uint(db)
+
+            for _ in range(ReadBuffer.read_uint(db)):
+                ReadBuffer.read_timing_point(db)
+
+            ReadBuffer.read_uint(db)
+            ReadBuffer.read_uint(db)
+            ReadBuffer.read_uint(db)
+            ReadBuffer.read_ubyte(db)
+            ReadBuffer.read_ubyte(db)
+            ReadBuffer.read_ubyte(db)
+            ReadBuffer.read_ubyte(db)
+            ReadBuffer.read_ushort(db)
+            ReadBuffer.read_float(db)
+            ReadBuffer.read_ubyte(db)
+            ReadBuffer.read_string(db)
+            ReadBuffer.read_string(db)
+            ReadBuffer.read_ushort(db)
+            ReadBuffer.read_string(db)
+            ReadBuffer.read_bool(db)
+            ReadBuffer.read_ulong(db)
+            ReadBuffer.read_bool(db)
+            folder_name = ReadBuffer.read_string(db)
+            ReadBuffer.read_ulong(db)
+            ReadBuffer.read_bool(db)
+            ReadBuffer.read_bool(db)
+            ReadBuffer.read_bool(db)
+            ReadBuffer.read_bool(db)
+            ReadBuffer.read_bool(db)
+            ReadBuffer.read_uint(db)
+            ReadBuffer.read_ubyte(db)
+
+            data.append({
+                'md5'   : md5_hash,
+                'md5h'  : md5_hash[-16:-4],
+                'path' : f'{folder_name}/{map_file}',
+                'last_modified' : last_modified,
+            })
+
+    return data
+
+
+def bench(func, filename, repeat):
+    # Best of `repeat` runs
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        data  = func(filename)
+        best  = min(best, time.perf_counter() - start)
+
+    return data, best
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compares the osu!.db reader against the old ReadBuffer based reader')
+    parser.add_argument('osu_db', help='path to osu!.db')
+    parser.add_argument('-n', '--repeat', type=int, default=3, help='runs per reader, the best is reported (default: 3)')
+    args = parser.parse_args()
+
+    data_old, time_old = bench(read_buffered, args.osu_db, args.repeat)
+    data_new, time_new = bench(OsuDbReader.get_beatmap_md5_paths, args.osu_db, args.repeat)
+
+    if data_old != data_new:
+        raise RuntimeError('Readers disagree on the contents of osu!.db')
+
+    print(f'{len(data_new)} maps')
+    print(f'ReadBuffer reader:  {time_old*1000:8.1f} ms')
+    print(f'OsuDbReader:        {time_new*1000:8.1f} ms  ({time_old/time_new:.1f}x)')
@@ -0,0 +1,24 @@
+import os
+import argparse
+
+from recording_file import RecordingFile, RecordingSet
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Merges recordings into one file grouped by map, with duplicate plays removed')
+    parser.add_argument('output', help='merged recording file to write')
+    parser.add_argument('recordings', nargs='+', help='recording files, or folders containing them')
+    args = parser.parse_args()
+
+    src_pathnames = RecordingSet.find_recordings(args.recordings)
+
+    # An existing output is merged into rather than replaced. Its plays are read along
+    # with the others, it's only replaced once they are all written out.
+    dst_pathname = os.path.abspath(args.output)
+    if os.path.exists(dst_pathname) and (dst_pathname not in src_pathnames):
+        src_pathnames.append(dst_pathname)
+
+    print(f'Merging {len(src_pathnames)} recordings into "{args.output}"...')
+    num_plays, num_dups = RecordingFile.merge(src_pathnames, args.output)
+    print(f'Wrote {num_plays} plays ({num_dups} duplicates dropped)')
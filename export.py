@@ -0,0 +1,124 @@
+import os
+import argparse
+
+import numpy as np
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from recording_file import RecordingSet, Data
+
+
+
+class Exporter():
+    '''
+    Streams recordings into Arrow IPC or Parquet files, one partition per map:
+
+        <output>/map=<map hash + mods in hex>/data.<arrow|parquet>
+
+    Maps are written one at a time. A map's plays are buffered and written together
+    every `ROW_GROUP_SIZE` rows, so a map becomes a few large row groups rather than
+    one small one per play, and memory use stays bounded by the row group size rather
+    than by the size of the recordings.
+    '''
+
+    FORMATS = [ 'parquet', 'arrow' ]
+
+    ROW_GROUP_SIZE = 1 << 20
+
+    def __init__(self, out_dir, out_format='parquet'):
+        if isinstance(pyarrow, type(None)):
+            raise ImportError('Exporting needs pyarrow. Install it with `pip install pyarrow`')
+
+        if out_format not in Exporter.FORMATS:
+            raise ValueError(f'Unknown format "{out_format}", expected one of {Exporter.FORMATS}')
+
+        self.out_dir    = out_dir
+        self.out_format = out_format
+        self.schema     = pyarrow.schema([ (name, pyarrow.from_numpy_dtype(Data.COLUMNS_DTYPE[name])) for name in Data.COLUMNS_DTYPE.names ])
+
+
+    def get_pathname(self, map_key):
+        return f'{self.out_dir}/map={int(map_key):x}/data.{self.out_format}'
+
+
+    def export(self, dataset):
+        '''
+        Returns the number of maps and plays written
+        '''
+        num_plays = 0
+
+        map_keys = dataset.get_maps()
+        for map_key in map_keys:
+            num_plays += self.__export_map(dataset, map_key)
+
+        return map_keys.shape[0], num_plays
+
+
+    def __export_map(self, dataset, map_key):
+        file_pathname = self.get_pathname(map_key)
+        os.makedirs(os.path.dirname(file_pathname), exist_ok=True)
+
+        if self.out_format == 'parquet':
+            writer = pyarrow.parquet.ParquetWriter(file_pathname, self.schema)
+        else:
+            writer = pyarrow.ipc.new_file(file_pathname, self.schema)
+
+        num_plays = 0
+        num_rows  = 0
+        buffered  = []
+
+        try:
+            for data_file in dataset.data_files:
+                chunks, views = data_file.get_map_plays(map_key)
+
+                for chunk, records in zip(chunks, views):
+                    buffered.append(Data.to_columns(records, chunk))
+                    num_rows  += records.shape[0]
+                    num_plays += 1
+
+                    if num_rows >= Exporter.ROW_GROUP_SIZE:
+                        self.__write_rows(writer, buffered)
+                        buffered = []
+                        num_rows = 0
+
+            if len(buffered) != 0:
+                self.__write_rows(writer, buffered)
+        finally:
+            writer.close()
+
+        return num_plays
+
+
+    def __write_rows(self, writer, buffered):
+        # All of the buffered plays go in as one row group
+        columns = [ pyarrow.array(np.concatenate([ columns[name] for columns in buffered ])) for name in self.schema.names ]
+        table   = pyarrow.Table.from_arrays(columns, schema=self.schema)
+
+        if self.out_format == 'parquet':
+            writer.write_table(table, row_group_size=table.num_rows)
+        else:
+            writer.write_table(table, max_chunksize=table.num_rows)
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Exports recordings to Arrow IPC or Parquet files partitioned by map')
+    parser.add_argument('output', help='folder to write the partitions to')
+    parser.add_argument('recordings', nargs='+', help='recording files, or folders containing them')
+    parser.add_argument('--format', choices=Exporter.FORMATS, default='parquet', help='output format (default: parquet)')
+    args = parser.parse_args()
+
+    exporter = Exporter(args.output, args.format)
+    dataset  = RecordingSet.open(args.recordings)
+
+    try:
+        print(f'Exporting {len(dataset.data_files)} recordings to "{args.output}"...')
+        num_maps, num_plays = exporter.export(dataset)
+        print(f'Wrote {num_plays} plays of {num_maps} maps')
+    finally:
+        dataset.close()
@@ -0,0 +1,271 @@
+import os
+import time
+import random
+import hashlib
+import argparse
+
+import numpy as np
+
+from osu_analysis import ManiaScoreData
+from osu_db_reader.buffer import WriteBuffer
+from osu_db_reader.osu_db_reader import OsuDbReader
+from recording_file import RecordingFile, Data
+
+
+
+class FixtureGenerator():
+    '''
+    Writes a synthetic osu! install for benchmarking at library sizes that are hard to
+    come by otherwise:
+
+        <out_dir>/osu!.db                  N mania maps, in sets of `MAPS_PER_SET`
+        <out_dir>/Songs/<set>/<map>.osu    the maps' .osu files, if asked for
+        <out_dir>/data/r/                  empty replay folder, for the replay monitor
+        <out_dir>/recordings/fixture.rec   recorded plays of the maps, if asked for
+
+    The md5 of each map in osu!.db is the md5 of the .osu file it would have, whether
+    the .osu files are written or not.
+    '''
+
+    DB_VERSION   = 20240101
+    MAPS_PER_SET = 4
+
+    # osu!.db is written out every this many maps, so memory use doesn't grow with N
+    FLUSH_STEP = 1000
+
+    NUM_PATTERNS = 16
+
+    def __init__(self, out_dir, seed=0):
+        self.out_dir = out_dir
+        self.rand    = random.Random(seed)
+        self.rng     = np.random.default_rng(seed)
+
+        self.__hit_objects = {}
+
+        os.makedirs(f'{out_dir}/data/r', exist_ok=True)
+
+
+    @staticmethod
+    def get_folder(set_id):
+        return f'{set_id} Generated - Fixture {set_id}'
+
+
+    @staticmethod
+    def get_map_file(set_id, map_idx):
+        return f'Generated - Fixture {set_id} (gen_fixtures) [{map_idx}K].osu'
+
+
+    @staticmethod
+    def get_num_keys(map_idx):
+        # Maps of a set go through 4, 6, 8 and 10 keys
+        return 4 + (map_idx % 4)*2
+
+
+    def get_hit_objects(self, num_keys, num_notes):
+        # Maps pick from a few note patterns per key count. Metadata already makes every
+        # .osu unique, and generating notes for each of a million maps is slow.
+        key = (num_keys, num_notes)
+        if key not in self.__hit_objects:
+            self.__hit_objects[key] = []
+
+            for _ in range(FixtureGenerator.NUM_PATTERNS):
+                columns = self.rng.integers(0, num_keys, num_notes)
+                lines   = [ f'{int((column + 0.5)*512/num_keys)},192,{1000 + i*150},1,0,0:0:0:0:' for i, column in enumerate(columns) ]
+                self.__hit_objects[key].append('\n'.join(lines) + '\n')
+
+        return self.rand.choice(self.__hit_objects[key])
+
+
+    def get_map_text(self, beatmap_id, set_id, map_idx, num_notes):
+        num_keys = FixtureGenerator.get_num_keys(map_idx)
+
+        return \
+            'osu file format v14\n\n' \
+            '[General]\nAudioFilename: audio.mp3\nMode: 3\n\n' \
+            f'[Metadata]\nTitle:Fixture {set_id}\nArtist:Generated\nCreator:gen_fixtures\nVersion:{map_idx}K\nBeatmapID:{beatmap_id}\nBeatmapSetID:{set_id}\n\n' \
+            f'[Difficulty]\nHPDrainRate:8\nCircleSize:{num_keys}\nOverallDifficulty:8\nApproachRate:5\nSliderMultiplier:1.4\nSliderTickRate:1\n\n' \
+            '[TimingPoints]\n0,150,4,2,0,60,1,0\n\n' \
+            '[HitObjects]\n' + self.get_hit_objects(num_keys, num_notes)
+
+
+    def write_maps(self, num_maps, num_notes=100, write_songs=False):
+        '''
+        Writes osu!.db, and the Songs folder if `write_songs`. Returns the maps written as
+        { 'md5', 'md5h', 'path', 'last_modified', 'beatmap_id', 'num_keys' } dicts.
+        '''
+        maps = []
+        buf  = WriteBuffer()
+
+        buf.write_uint(FixtureGenerator.DB_VERSION)
+        buf.write_uint((num_maps + FixtureGenerator.MAPS_PER_SET - 1) // FixtureGenerator.MAPS_PER_SET)
+        buf.write_bool(True)
+        buf.write_ulong(0)
+        buf.write_string('fixture')
+        buf.write_uint(num_maps)
+
+        with open(f'{self.out_dir}/osu!.db', 'wb') as db:
+            for beatmap_id in range(1, num_maps + 1):
+                set_id  = (beatmap_id - 1) // FixtureGenerator.MAPS_PER_SET + 1
+                map_idx = (beatmap_id - 1) % FixtureGenerator.MAPS_PER_SET
+
+                folder   = FixtureGenerator.get_folder(set_id)
+                map_file = FixtureGenerator.get_map_file(set_id, map_idx)
+                map_text = self.get_map_text(beatmap_id, set_id, map_idx, num_notes).encode('utf-8')
+                md5      = hashlib.md5(map_text).hexdigest()
+
+                if write_songs:
+                    os.makedirs(f'{self.out_dir}/Songs/{folder}', exist_ok=True)
+                    with open(f'{self.out_dir}/Songs/{folder}/{map_file}', 'wb') as f:
+                        f.write(map_text)
+
+                last_modified = 638000000000000000 + beatmap_id
+                self.__write_map(buf, md5, folder, map_file, last_modified, beatmap_id, set_id, map_idx)
+
+                maps.append({
+                    'md5'   : md5,
+                    'md5h'  : md5[-16:-4],
+                    'path' : f'{folder}/{map_file}',
+                    'last_modified' : last_modified,
+                    'beatmap_id' : beatmap_id,
+                    'num_keys' : FixtureGenerator.get_num_keys(map_idx),
+                })
+
+                if beatmap_id % FixtureGenerator.FLUSH_STEP == 0:
+                    db.write(buf.data)
+                    buf.clear_buffer()
+
+            # Permissions
+            buf.write_uint(0)
+            db.write(buf.data)
+
+        return maps
+
+
+    def __write_map(self, buf, md5, folder, map_file, last_modified, beatmap_id, set_id, map_idx):
+        buf.write_string('Generated')               # artist
+        buf.write_string('ジェネレーテッド')          # artist unicode
+        buf.write_string(f'Fixture {set_id}')       # title
+        buf.write_string(f'フィクスチャ {set_id}')    # title unicode
+        buf.write_string('gen_fixtures')            # mapper
+        buf.write_string(f'{map_idx}K')             # difficulty
+        buf.write_string('audio.mp3')
+        buf.write_string(md5)
+        buf.write_string(map_file)
+        buf.write_ubyte(4)        # ranked status
+        buf.write_ushort(100)     # hitcircles
+        buf.write_ushort(0)       # sliders
+        buf.write_ushort(0)       # spinners
+        buf.write_ulong(last_modified)
+        buf.write_float(5)        # AR
+        buf.write_float(FixtureGenerator.get_num_keys(map_idx))  # CS (keys)
+        buf.write_float(8)        # HP
+        buf.write_float(8)        # OD
+        buf.write_double(1.4)     # SV
+
+        # Star ratings for each gamemode
+        for _ in range(4):
+            num_ratings = self.rand.randrange(4)
+            buf.write_uint(num_ratings)
+            for i in range(num_ratings):
+                buf.write_int_double(1 << i, self.rand.uniform(1, 8))
+
+        buf.write_uint(60)        # drain time
+        buf.write_uint(60000)     # total time
+        buf.write_uint(0)         # preview time
+
+        num_timing_points = self.rand.randrange(1, 8)
+        buf.write_uint(num_timing_points)
+        for i in range(num_timing_points):
+            buf.write_timing_point(150, i*10000, True)
+
+        buf.write_uint(beatmap_id)
+        buf.write_uint(set_id)
+        buf.write_uint(0)         # thread id
+        for _ in range(4):
+            buf.write_ubyte(9)    # grades
+        buf.write_ushort(0)       # local offset
+        buf.write_float(0.7)      # stack leniency
+        buf.write_ubyte(3)        # gamemode (mania)
+        buf.write_string('')      # song source
+        buf.write_string(' '.join([ 'tag' ]*self.rand.randrange(20)))
+        buf.write_ushort(0)       # online offset
+        buf.write_string('')      # title font
+        buf.write_bool(True)      # unplayed
+        buf.write_ulong(0)        # last played
+        buf.write_bool(False)     # osz2
+        buf.write_string(folder)
+        buf.write_ulong(0)        # last checked
+        for _ in range(5):
+            buf.write_bool(False) # ignore sounds/skin, disable storyboard/video, visual override
+        buf.write_uint(0)         # last modified
+        buf.write_ubyte(0)        # scroll speed
+
+
+    def write_recording(self, maps, num_plays, num_notes=100):
+        '''
+        Writes `num_plays` plays of random maps, each with `num_notes` notes and their releases
+        '''
+        os.makedirs(f'{self.out_dir}/recordings', exist_ok=True)
+        data_file = RecordingFile.create(f'{self.out_dir}/recordings/fixture.rec', Data.RECORD_DTYPE)
+
+        timestamp = time.time() - num_plays*60
+        hash_mask = 0xFFFFFFFFFFFF0000
+
+        # Written a batch at a time, so the footer isn't written and synced for every play
+        plays = []
+
+        for i in range(num_plays):
+            beatmap = maps[self.rand.randrange(len(maps))]
+            columns = self.rng.integers(0, beatmap['num_keys'], num_notes)
+            note_t  = 1000 + np.arange(num_notes)*150.0
+
+            records = np.empty(num_notes*2, dtype=Data.RECORD_DTYPE)
+            records['keys']        = np.repeat(columns, 2)
+            records['offsets']     = self.rng.normal(0, 20, num_notes*2)
+            records['timings']     = np.repeat(note_t, 2) + np.tile([ 0, 75 ], num_notes) + records['offsets']
+            records['hit_type'][0::2] = ManiaScoreData.TYPE_HITP
+            records['hit_type'][1::2] = ManiaScoreData.TYPE_HITR
+
+            plays.append(dict(rows=records, timestamp=timestamp + i*60, map_hash=int(beatmap['md5'], 16) & hash_mask, mods=0, map_id=beatmap['beatmap_id']))
+
+            if len(plays) == RecordingFile.COPY_BATCH:
+                data_file.append_many(plays)
+                plays = []
+
+        if len(plays) != 0:
+            data_file.append_many(plays)
+
+        data_file.close()
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generates a synthetic osu!.db, Songs folder and recordings for benchmarking')
+    parser.add_argument('output', help='folder to generate into')
+    parser.add_argument('-n', '--maps', type=int, default=10000, help='number of maps in osu!.db (default: 10000)')
+    parser.add_argument('--songs', action='store_true', help='also write the .osu files')
+    parser.add_argument('--plays', type=int, default=0, help='number of recorded plays to generate (default: 0)')
+    parser.add_argument('--notes', type=int, default=100, help='notes per map and per play (default: 100)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--verify', action='store_true', help='read osu!.db back and check it matches')
+    args = parser.parse_args()
+
+    generator = FixtureGenerator(args.output, args.seed)
+
+    start = time.perf_counter()
+    maps  = generator.write_maps(args.maps, args.notes, args.songs)
+    print(f'Wrote {len(maps)} maps in {time.perf_counter() - start:.2f} s')
+
+    if args.plays > 0:
+        start = time.perf_counter()
+        generator.write_recording(maps, args.plays, args.notes)
+        print(f'Wrote {args.plays} plays in {time.perf_counter() - start:.2f} s')
+
+    if args.verify:
+        read_maps = OsuDbReader.get_beatmap_md5_paths(f'{args.output}/osu!.db')
+        expected  = [ { key : m[key] for key in [ 'md5', 'md5h', 'path', 'last_modified' ] } for m in maps ]
+
+        if read_maps != expected:
+            raise RuntimeError('osu!.db did not read back the same')
+
+        print('osu!.db reads back the same')
@@ -0,0 +1,100 @@
+import os
+import json
+import hashlib
+
+
+
+class IngestJournal():
+    '''
+    Write-ahead journal of replays that are being ingested.
+
+    Before a replay is processed, a `begin` entry is written with the replay's content
+    hash, its path, and how many plays the recording it goes into held at that point.
+    Once the play is in the recording the entry is committed. Every write is fsync'd.
+
+    When nothing is pending the journal is truncated to empty, so on startup only
+    replays that were in flight when the app died need to be looked at.
+    '''
+
+    def __init__(self, file_pathname):
+        self.file_pathname = file_pathname
+        self.__pending = {}
+
+        if os.path.exists(file_pathname):
+            with open(file_pathname, 'r') as f:
+                for line in f:
+                    try: entry = json.loads(line)
+                    except json.decoder.JSONDecodeError:
+                        # Torn write of the last entry
+                        break
+
+                    self.__apply(entry)
+
+        # Start the journal over with only what is still pending. This also gets rid
+        # of a torn entry, which would otherwise have new entries appended onto it.
+        # The old journal is only replaced once the new one is on disk.
+        with open(f'{file_pathname}.tmp', 'w') as f:
+            for entry in self.__pending.values():
+                f.write(json.dumps(entry) + '\n')
+
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(f'{file_pathname}.tmp', file_pathname)
+        self.__file = open(file_pathname, 'a')
+
+
+    @staticmethod
+    def get_file_hash(file_pathname):
+        with open(file_pathname, 'rb') as f:
+            return hashlib.md5(f.read()).hexdigest()
+
+
+    def get_pending(self):
+        return list(self.__pending.values())
+
+
+    def begin(self, replay_hash, replay_pathname, data_file):
+        self.__write({
+            'op'         : 'begin',
+            'hash'       : replay_hash,
+            'replay'     : os.path.abspath(replay_pathname),
+            'recording'  : os.path.abspath(data_file.file_pathname),
+            'num_chunks' : data_file.num_chunks,
+        })
+
+
+    def commit(self, replay_hash):
+        # The play is in the recording
+        self.__write({ 'op' : 'commit', 'hash' : replay_hash })
+
+
+    def abort(self, replay_hash):
+        # Nothing was recorded for the replay, and it should not be retried
+        self.__write({ 'op' : 'abort', 'hash' : replay_hash })
+
+
+    def close(self):
+        if not self.__file.closed:
+            self.__file.close()
+
+
+    def __apply(self, entry):
+        if entry['op'] == 'begin':
+            self.__pending[entry['hash']] = entry
+        else:
+            self.__pending.pop(entry['hash'], None)
+
+
+    def __write(self, entry):
+        self.__apply(entry)
+
+        # Nothing in flight - an empty journal is the commit point
+        if len(self.__pending) == 0:
+            self.__file.seek(0)
+            self.__file.truncate()
+        else:
+            self.__file.write(json.dumps(entry) + '\n')
+
+        self.__file.flush()
+        os.fsync(self.__file.fileno())
@@ -0,0 +1,83 @@
+import threading
+import traceback
+import collections
+
+
+
+class IngestQueue():
+    '''
+    Bounded queue of replays waiting to be recorded, handled by its own worker threads.
+
+    A replay that is already waiting or being handled is not queued again. When the
+    queue is full, `put` waits for room, which holds back whatever is producing replays
+    instead of letting the backlog grow without bound.
+
+    The queue can start out paused; replays still queue up but are not handled until
+    it's resumed.
+    '''
+
+    def __init__(self, handler, max_size=64, num_workers=1, paused=False):
+        self.handler  = handler
+        self.max_size = max_size
+
+        self.__queue  = collections.deque()
+        self.__queued = set()   # Waiting or being handled
+        self.__cond   = threading.Condition()
+        self.__paused = paused
+        self.__closed = False
+
+        self.__workers = [ threading.Thread(target=self.__work, daemon=True) for _ in range(num_workers) ]
+        for worker in self.__workers:
+            worker.start()
+
+
+    def put(self, replay_path, timeout=None):
+        '''
+        Queues the replay. Returns False if it was not queued - it is already queued, or
+        the queue stayed full for `timeout` seconds.
+        '''
+        with self.__cond:
+            has_room = lambda: self.__closed or (len(self.__queue) < self.max_size)
+            if not self.__cond.wait_for(has_room, timeout):
+                return False
+
+            if self.__closed or (replay_path in self.__queued):
+                return False
+
+            self.__queue.append(replay_path)
+            self.__queued.add(replay_path)
+            self.__cond.notify_all()
+            return True
+
+
+    def resume(self):
+        with self.__cond:
+            self.__paused = False
+            self.__cond.notify_all()
+
+
+    def close(self):
+        # Replays still waiting are dropped
+        with self.__cond:
+            self.__closed = True
+            self.__cond.notify_all()
+
+
+    def __work(self):
+        while True:
+            with self.__cond:
+                self.__cond.wait_for(lambda: self.__closed or ((not self.__paused) and (len(self.__queue) > 0)))
+                if self.__closed:
+                    return
+
+                replay_path = self.__queue.popleft()
+
+                # There is room for a waiting `put`
+                self.__cond.notify_all()
+
+            try: self.handler(replay_path)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                with self.__cond:
+                    self.__queued.discard(replay_path)
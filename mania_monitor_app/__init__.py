@@ -12,6 +12,8 @@ from pyqtgraph import dockarea
 from osu_performance_recorder import Recorder, Data
 from app_cfg import AppConfig
 
+from ._selection import Selection
+
 
 class ManiaMonitor(QtWidgets.QMainWindow):
 
@@ -68,7 +70,7 @@ class ManiaMonitor(QtWidgets.QMainWindow):
 
         print('Initializing recorder...')
 
-        self.recorder = Recorder(AppConfig.cfg['osu_dir'], self.__handle_new_replay_qt)
+        self.recorder = Recorder(AppConfig.cfg['osu_dir'], self.__handle_new_replay_qt, self.__handle_index_progress_qt)
         self.show()
 
 
@@ -84,12 +86,16 @@ class ManiaMonitor(QtWidgets.QMainWindow):
         self.open_action = QtWidgets.QAction("&Open", self)
         self.open_action.triggered.connect(self.__open_recording_dialog)
 
+        self.open_dir_action = QtWidgets.QAction("Open &folder", self)
+        self.open_dir_action.triggered.connect(self.__open_recording_dir_dialog)
+
         self.view_menu = QtWidgets.QMenu("&View", self)
         self.view_menu.addAction(self.nps_action)
 
         self.file_menu = QtWidgets.QMenu("&File", self)
         self.file_menu.addAction(self.new_action)
         self.file_menu.addAction(self.open_action)
+        self.file_menu.addAction(self.open_dir_action)
 
         self.menu_bar = QtWidgets.QMenuBar(self)
         self.menu_bar.addMenu(self.file_menu)
@@ -109,7 +115,7 @@ class ManiaMonitor(QtWidgets.QMainWindow):
 
         self.score_list = QtWidgets.QListWidget()
 
-        self.data_cache = None
+        self.selection = None
         self.map_list_data = []
         self.selected_map_hash = None
 
@@ -128,11 +134,11 @@ class ManiaMonitor(QtWidgets.QMainWindow):
         ManiaMonitor.PlaysGraph.__init__(self, pos='bottom')
 
         ManiaMonitor.NoteOffsetGraph.region_changed_event.connect(
-            lambda event_data: ManiaMonitor.NoteDistrGraph._plot_data(self, self.data_cache, event_data)
+            lambda event_data: ManiaMonitor.NoteDistrGraph._plot_data(self, self.selection, event_data)
         )
 
         # ManiaMonitor.NoteOffsetProcGraph.region_changed_event.connect(
-        #     lambda event_data: ManiaMonitor.NoteDistrGraph._plot_data(self, self.data_cache, event_data)
+        #     lambda event_data: ManiaMonitor.NoteDistrGraph._plot_data(self, self.selection, event_data)
         # )
 
         # ManiaMonitor.NoteOffsetProcGraph.calc_done_event.connect(
@@ -156,9 +162,15 @@ class ManiaMonitor(QtWidgets.QMainWindow):
         )
 
 
+    def __handle_index_progress_qt(self, num_read, num_total):
+        if num_read < num_total:
+            self.statusBar().showMessage(f'Indexing maps... {num_read}/{num_total}')
+        else:
+            self.statusBar().showMessage(f'Indexed {num_total} maps', 5000)
+
+
     def __handle_new_replay_qt(self, args):
-        maps_table, data, title = args
-        self.data_cache = data
+        map_index, dataset, title = args
 
         print(f'Handling new replay "{title}"...')
 
@@ -166,23 +178,27 @@ class ManiaMonitor(QtWidgets.QMainWindow):
             try: self.setWindowTitle(title)
             except AttributeError: pass
 
-        if maps_table != None:
-            is_new_maps = self.__check_new_maps(maps_table, data)
+        if map_index != None:
+            is_new_maps = self.__check_new_maps(map_index, dataset)
 
             if is_new_maps:
                 self.map_list.setCurrentRow(len(self.map_list_data) - 1)
 
-        # Select data
-        tmp = data.astype(np.uint64)
-        data = data[(tmp[:, Data.HASH] + tmp[:, Data.MODS]) == int(self.selected_map_hash, 16)]
+        # Select data. Only the selected map's rows are read from the recording.
+        map_key = int(self.selected_map_hash, 16)
+        data, plays = dataset.select(map_key)
+
+        # Graphs share what they derive from the selection. Features are read, or made,
+        # only for the plays a graph uses.
+        self.selection = Selection(data, plays, lambda play_idxs: dataset.get_features(map_key, data, plays, play_idxs))
 
-        ManiaMonitor.MapDisplay._plot_data(self, data)
-        ManiaMonitor.HitOffsetGraph._plot_data(self, data)
-        ManiaMonitor.HitDistrGraph._plot_data(self, data)
-        ManiaMonitor.NoteOffsetGraph._plot_data(self, data)
-        ManiaMonitor.NoteOffsetProcGraph._plot_data(self, data)
-        ManiaMonitor.PlaysGraph._plot_data(self, data)
-        ManiaMonitor.NoteIntervalGraph._plot_data(self, data)
+        ManiaMonitor.MapDisplay._plot_data(self, self.selection)
+        ManiaMonitor.HitOffsetGraph._plot_data(self, self.selection)
+        ManiaMonitor.HitDistrGraph._plot_data(self, self.selection)
+        ManiaMonitor.NoteOffsetGraph._plot_data(self, self.selection)
+        ManiaMonitor.NoteOffsetProcGraph._plot_data(self, self.selection)
+        ManiaMonitor.PlaysGraph._plot_data(self, self.selection)
+        ManiaMonitor.NoteIntervalGraph._plot_data(self, self.selection)
 
 
     def _create_graph(self, graph_id=None, dock_name=' ', pos='bottom', relative_to=None, widget=None, plot=None):
@@ -211,24 +227,23 @@ class ManiaMonitor(QtWidgets.QMainWindow):
             widget.addItem(plot)
 
 
-    def __check_new_maps(self, maps_table, data):
+    def __check_new_maps(self, map_index, dataset):
         is_new_maps = False
         vhex = np.vectorize(lambda x: hex(x)[2:])
-        data = data.astype(np.uint64)
 
         # Determine new play data
-        unique_map_hahes = np.unique(data[:, Data.HASH] + data[:, Data.MODS])
+        unique_map_hahes = np.unique(dataset.get_maps())
         new_map_hashes   = np.setdiff1d(vhex(unique_map_hahes), self.map_list_data)
 
         # Go through unlisted maps
         for new_map_hash in new_map_hashes:
-            # Decode hash
-            map_hash = new_map_hash[:-4]
+            # Decode hash. hex() drops leading zeros, md5h has them
+            map_hash = new_map_hash[:-4].zfill(12)
             map_mods = new_map_hash[-4:]
 
             # Find the map the hash is related to in db
-            maps = maps_table.search(tinydb.where('md5h') == map_hash)
-            if len(maps) == 0:
+            md5 = map_index.get_md5(map_hash)
+            if md5 == None:
                 self.map_list.addItem(new_map_hash)
                 self.map_list_data.append(new_map_hash)
                 is_new_maps = True
@@ -241,7 +256,7 @@ class ManiaMonitor(QtWidgets.QMainWindow):
             mods = f' +{mods}' if len(mods) != 0 else ''
 
             # Add map to list
-            self.map_list.addItem(maps[0]['path'].split('/')[-1] + mods)
+            self.map_list.addItem(map_index.get_path(md5).split('/')[-1] + mods)
             self.map_list_data.append(new_map_hash)
             is_new_maps = True
 
@@ -256,7 +271,7 @@ class ManiaMonitor(QtWidgets.QMainWindow):
 
         if self.selected_map_hash != selected_map_hash:
             self.selected_map_hash = selected_map_hash
-            self.__handle_new_replay_qt((None, self.recorder.data, None))
+            self.__handle_new_replay_qt((None, self.recorder.snapshot, None))
 
             self.__update_top_nps()
 
@@ -268,15 +283,26 @@ class ManiaMonitor(QtWidgets.QMainWindow):
 
 
     def __open_recording_dialog(self):
-        name_filter = 'npy files (*.npy)'
+        name_filter = 'Recording files (*.rec *.npy)'
+
+        # Selecting several files opens them together as one dataset
+        file_pathnames = QtWidgets.QFileDialog.getOpenFileNames(self, 'Open data files',  f'./data', name_filter)[0]
+        if len(file_pathnames) == 0:
+            return
+
+        self.map_list.clear()
+        self.map_list_data.clear()
+        self.recorder.open_files(file_pathnames)
+
 
-        file_pathname = QtWidgets.QFileDialog.getOpenFileName(self, 'Open data file',  f'./data', name_filter)[0]
-        if len(file_pathname) == 0:
+    def __open_recording_dir_dialog(self):
+        dir_pathname = str(QtWidgets.QFileDialog.getExistingDirectory(self, 'Open data folder', f'./data'))
+        if len(dir_pathname) == 0:
             return
 
         self.map_list.clear()
         self.map_list_data.clear()
-        self.recorder.open_file(file_pathname)
+        self.recorder.open_files([ dir_pathname ])
 
 
     def __record_nps(self, nps_data):
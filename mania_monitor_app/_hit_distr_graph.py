@@ -42,19 +42,17 @@ class HitDistrGraph():
         self.__model_plot = self.graphs[self.__id]['widget'].plot()
 
 
-    def _plot_data(self, data):
-        HitDistrGraph.__plot_hit_distr(self, data)
-        HitDistrGraph.__plot_stats(self, data)
+    def _plot_data(self, selection):
+        # Only the latest play is displayed
+        hits = selection.latest.hits
 
+        HitDistrGraph.__plot_hit_distr(self, hits)
+        HitDistrGraph.__plot_stats(self, hits)
 
-    def __plot_hit_distr(self, data):
-        # Determine what was the latest play
-        data_filter = \
-            (data[:, Data.TIMESTAMP] == max(data[:, Data.TIMESTAMP])) & \
-            (data[:, Data.HIT_TYPE] == ManiaScoreData.TYPE_HITP)
 
+    def __plot_hit_distr(self, data):
         # Extract timings and hit_offsets
-        hit_offsets = data[:, Data.OFFSETS][data_filter]
+        hit_offsets = data[:, Data.OFFSETS]
 
         # Get a histogram of offsets for each ms
         hit_freqs = Utils.get_freq_hist(hit_offsets)
@@ -67,13 +65,8 @@ class HitDistrGraph():
 
 
     def __plot_stats(self, data):
-        # Determine what was the latest play
-        data_filter = \
-            (data[:, Data.TIMESTAMP] == max(data[:, Data.TIMESTAMP])) & \
-            (data[:, Data.HIT_TYPE] == ManiaScoreData.TYPE_HITP)
-
         # Extract timings and hit_offsets
-        hit_offsets = data[:, Data.OFFSETS][data_filter]
+        hit_offsets = data[:, Data.OFFSETS]
         mean_offset = np.mean(hit_offsets)
         std_offset  = np.std(hit_offsets)
 
@@ -50,20 +50,17 @@ class HitOffsetGraph():
         self.graphs[self.__id]['widget'].addItem(pyqtgraph.FillBetweenItem(self.__offset_std_pos, self.__offset_std_neg, (100, 100, 255, 50)))
 
 
-    def _plot_data(self, data):
-        HitOffsetGraph.__plot_misses(self, data)
-        HitOffsetGraph.__plot_hit_offsets(self, data)
-        HitOffsetGraph.__plot_avg_global(self, data)
-        HitOffsetGraph.__plot_avg_local(self, data)
+    def _plot_data(self, selection):
+        # Only the latest play is displayed
+        selection = selection.latest
 
+        HitOffsetGraph.__plot_misses(self, selection.misses)
+        HitOffsetGraph.__plot_hit_offsets(self, selection.hits)
+        HitOffsetGraph.__plot_avg_global(self, selection.hits)
+        HitOffsetGraph.__plot_avg_local(self, selection.hits)
 
-    def __plot_hit_offsets(self, data):
-        # Determine what was the latest play
-        data_filter = \
-            (data[:, Data.TIMESTAMP] == max(data[:, Data.TIMESTAMP])) & \
-            (data[:, Data.HIT_TYPE] == ManiaScoreData.TYPE_HITP)
-        data = data[data_filter]
 
+    def __plot_hit_offsets(self, data):
         # Extract timings and hit_offsets
         hit_timings = data[:, Data.TIMINGS]
         hit_offsets = data[:, Data.OFFSETS]
@@ -78,24 +75,12 @@ class HitOffsetGraph():
 
 
     def __plot_misses(self, data):
-        # Determine what was the latest play
-        data_filter = \
-            (data[:, Data.TIMESTAMP] == max(data[:, Data.TIMESTAMP])) & \
-            (data[:, Data.HIT_TYPE] == ManiaScoreData.TYPE_MISSP)
-        data = data[data_filter]
-
         # Extract data and plot
         hit_timings = data[:, Data.TIMINGS]
         self.__miss_plot.setData(hit_timings)
 
 
     def __plot_avg_global(self, data):
-        # Determine what was the latest play
-        data_filter = \
-            (data[:, Data.TIMESTAMP] == max(data[:, Data.TIMESTAMP])) & \
-            (data[:, Data.HIT_TYPE] == ManiaScoreData.TYPE_HITP)
-        data = data[data_filter]
-
         # Extract timings and hit_offsets
         hit_offsets = data[:, Data.OFFSETS]
         mean_offset = np.mean(hit_offsets)
@@ -110,14 +95,9 @@ class HitOffsetGraph():
 
 
     def __plot_avg_local(self, data):
-        # Determine what was the latest play
-        data_filter = \
-            (data[:, Data.TIMESTAMP] == max(data[:, Data.TIMESTAMP])) & \
-            (data[:, Data.HIT_TYPE] == ManiaScoreData.TYPE_HITP)
-
         # Extract timings and hit_offsets
-        hit_timings = data[:, Data.TIMINGS][data_filter]
-        hit_offsets = data[:, Data.OFFSETS][data_filter]
+        hit_timings = data[:, Data.TIMINGS]
+        hit_offsets = data[:, Data.OFFSETS]
 
         # Calculate view
         xMin = min(hit_timings)
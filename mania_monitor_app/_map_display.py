@@ -38,19 +38,12 @@ class MapDisplay():
         self.__note_timings = None
 
 
-    def _plot_data(self, data):
-        MapDisplay.__plot_notes(self, data)
+    def _plot_data(self, selection):
+        # Notes are taken from the first play
+        MapDisplay.__plot_notes(self, selection.first.notes)
 
 
     def __plot_notes(self, data):
-        # Determine what was the latest play
-        data_filter = \
-            (data[:, Data.TIMESTAMP] == min(data[:, Data.TIMESTAMP])) & \
-            ((data[:, Data.HIT_TYPE] == ManiaScoreData.TYPE_HITP) | \
-             (data[:, Data.HIT_TYPE] == ManiaScoreData.TYPE_MISSP))
-
-        data = data[data_filter]
-
         # Extract timings and hit_offsets
         self.__note_column  = data[:, Data.KEYS]
         self.__note_timings = data[:, Data.TIMINGS] - data[:, Data.OFFSETS]
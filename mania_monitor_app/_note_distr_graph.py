@@ -42,30 +42,23 @@ class NoteDistrGraph():
         self.__model_plot = self.graphs[self.__id]['widget'].plot()
 
 
-    def _plot_data(self, data, note_range):
-        NoteDistrGraph.__plot_hit_distr(self, data, note_range)
-        NoteDistrGraph.__plot_stats(self, data, note_range)
+    def _plot_data(self, selection, note_range):
+        NoteDistrGraph.__plot_hit_distr(self, selection, note_range)
+        NoteDistrGraph.__plot_stats(self, selection, note_range)
 
 
-    def __plot_hit_distr(self, data, note_range):
+    def __plot_hit_distr(self, selection, note_range):
         if type(note_range) == type(None):
             return
 
         start, end = note_range
         if start == end: end += 1
 
-        # Determine what was the latest play
-        data_filter = \
-            (data[:, Data.HIT_TYPE] == ManiaScoreData.TYPE_HITP)
+        # Press hits of the notes in range, throughout all plays
+        num = selection.hit_note_idxs
 
-        # Extract timings and hit_offsets
-        plays = np.unique(data[:, Data.TIMESTAMP])
-        hit_offsets = data[:, Data.OFFSETS]
-        num = np.tile(np.arange(int(hit_offsets.shape[0]/plays.shape[0])), plays.shape[0])
-
-        num_filter = (start <= num) & (num <= end) & data_filter
-        hit_offsets = hit_offsets[num_filter]
-        num = num[num_filter]
+        num_filter = (start <= num) & (num <= end)
+        hit_offsets = selection.hits[num_filter, Data.OFFSETS]
 
         # Get a histogram of offsets for each ms
         hit_freqs = Utils.get_freq_hist(hit_offsets)
@@ -77,25 +70,18 @@ class NoteDistrGraph():
             self.graphs[self.__id]['widget'].setLimits(yMax=yMax)
 
 
-    def __plot_stats(self, data, note_range):
+    def __plot_stats(self, selection, note_range):
         if type(note_range) == type(None):
             return
 
         start, end = note_range
         if start == end: end += 1
 
-        # Determine what was the latest play
-        data_filter = \
-            (data[:, Data.HIT_TYPE] == ManiaScoreData.TYPE_HITP)
-
-        # Extract timings and hit_offsets
-        plays = np.unique(data[:, Data.TIMESTAMP])
-        hit_offsets = data[:, Data.OFFSETS]
-        num = np.tile(np.arange(int(hit_offsets.shape[0]/plays.shape[0])), plays.shape[0])
+        # Press hits of the notes in range, throughout all plays
+        num = selection.hit_note_idxs
 
-        num_filter = (start <= num) & (num <= end) & data_filter
-        hit_offsets = hit_offsets[num_filter]
-        num = num[num_filter]
+        num_filter = (start <= num) & (num <= end)
+        hit_offsets = selection.hits[num_filter, Data.OFFSETS]
 
         mean_offset = np.mean(hit_offsets)
         std_offset  = np.std(hit_offsets)
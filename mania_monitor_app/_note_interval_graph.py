@@ -4,7 +4,6 @@ from PyQt5.QtGui import *
 import numpy as np
 from pyqtgraph.functions import mkPen
 
-from osu_analysis import ManiaScoreData
 from osu_performance_recorder import Data
 
 from ._callback import callback
@@ -36,45 +35,33 @@ class NoteIntervalGraph():
         self.graphs[self.__id]['widget'].addItem(self.__error_bar_graph)
 
 
-    def _plot_data(self, data):
-        NoteIntervalGraph.__plot_note_intervals(self, data)
+    def _plot_data(self, selection):
+        # Only the latest play is used
+        selection = selection.latest
+        NoteIntervalGraph.__plot_note_intervals(self, selection.notes, selection.features)
 
 
-    def __plot_note_intervals(self, data):
-        # Gets hit presses and misses for the latest play
-        score_filter = \
-            (data[:, Data.TIMESTAMP] == max(data[:, Data.TIMESTAMP])) & \
-            ((data[:, Data.HIT_TYPE] == ManiaScoreData.TYPE_HITP) | \
-            (data[:, Data.HIT_TYPE] == ManiaScoreData.TYPE_MISSP))
-        data = data[score_filter]
+    def __plot_note_intervals(self, data, features):
+        # Hit presses and misses
 
-        # Extract timings and hit_offsets
-        note_columns = data[:, Data.KEYS]
-        note_timings = data[:, Data.TIMINGS] - data[:, Data.OFFSETS]
+        # Data for each column is put after the other
+        note_columns = data[:, Data.KEYS].astype(int)
+        order = np.argsort(note_columns, kind='stable')
+        note_columns = note_columns[order]
 
-        # num_interval size = note timings size - num columns becuase delta is taken per column
-        num_columns = np.unique(note_columns).shape[0]
-        num_intervals = note_timings.shape[0] - num_columns
+        # Interval to the previous note in the same column. The first note of
+        # each column has none.
+        note_intervals = features['ic'][order, note_columns]
+        has_prev       = np.isfinite(note_intervals)
 
-        # Data for each column is put after the other, so `offset` will keep track where to insert it
-        interval_data = np.zeros((num_intervals, 4))
-        offset = 0
+        hit_timings_d  = np.diff(data[order, Data.TIMINGS], prepend=np.nan)
+        hit_types      = data[order, Data.HIT_TYPE]
 
-        for column in np.unique(note_columns):
-            column_filter = data[:, Data.KEYS] == column
-
-            note_intervals = np.diff(note_timings[column_filter])
-            hit_timings_d  = np.diff(data[column_filter, Data.TIMINGS])
-            hit_types      = data[column_filter, Data.HIT_TYPE]
-
-            # Set the block of data
-            interval_data[offset : note_intervals.shape[0] + offset, 0] = note_intervals
-            interval_data[offset : note_intervals.shape[0] + offset, 1] = column
-            interval_data[offset : note_intervals.shape[0] + offset, 2] = hit_timings_d
-            interval_data[offset : note_intervals.shape[0] + offset, 3] = hit_types[1:]
-
-            # Set offset to the the start of next data block
-            offset += note_intervals.shape[0]
+        interval_data = np.zeros((np.count_nonzero(has_prev), 4))
+        interval_data[:, 0] = note_intervals[has_prev]
+        interval_data[:, 1] = note_columns[has_prev]
+        interval_data[:, 2] = hit_timings_d[has_prev]
+        interval_data[:, 3] = hit_types[has_prev]
 
         # Process interval data for graphing
         interval_data = interval_data.astype(int)
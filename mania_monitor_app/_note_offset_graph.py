@@ -41,37 +41,16 @@ class NoteOffsetGraph():
         self.graphs[self.__id]['widget'].addItem(self.__region_plot)
 
 
-    def _plot_data(self, data):
-        NoteOffsetGraph.__plot_hit_offsets(self, data)
+    def _plot_data(self, selection):
+        NoteOffsetGraph.__plot_hit_offsets(self, selection)
 
 
-    def __plot_hit_offsets(self, data):
-        # Gets hit presses and misses throuhout all plays
-        score_filter = \
-            (data[:, Data.HIT_TYPE] == ManiaScoreData.TYPE_HITP) | \
-            (data[:, Data.HIT_TYPE] == ManiaScoreData.TYPE_MISSP)
-        data = data[score_filter]
+    def __plot_hit_offsets(self, selection):
+        print(f'Num plays: {selection.num_plays}     num notes: {selection.num_notes}   total: {selection.notes.shape[0]}')
 
-        # Determine the number of plays there are, and number of notes in each play
-        plays = np.unique(data[:, Data.TIMESTAMP])
-        num_notes_total = data.shape[0]
-        num_notes = int(num_notes_total/plays.shape[0])
-
-        print(f'Num plays: {plays.shape[0]}     num notes: {num_notes_total/plays.shape[0]}   total: {num_notes_total}')
-
-        #num_notes1 = int(data.shape[0]/plays.shape[0])
-        #num_notes_plays = [ data[data[:, Data.TIMESTAMP] == play].shape[0] for play in plays ]
-        #print(num_notes1, num_notes_plays)
-
-        # Build note indexing data
-        note_idxs = np.arange(num_notes)
-        note_idxs = np.tile(note_idxs, plays.shape[0])
-
-        miss_filter = \
-            (data[:, Data.HIT_TYPE] != ManiaScoreData.TYPE_MISSP)
-
-        hit_offsets = data[miss_filter, Data.OFFSETS]
-        note_idxs = note_idxs[miss_filter]
+        # Press hits throuhout all plays, by their note
+        hit_offsets = selection.hits[:, Data.OFFSETS]
+        note_idxs   = selection.hit_note_idxs
 
         # Calculate view
         xMin = 0
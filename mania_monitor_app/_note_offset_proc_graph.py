@@ -47,40 +47,19 @@ class NoteOffsetProcGraph():
         self.graphs[self.__id]['widget'].addItem(self.__error_bar_graph)
 
 
-    def _plot_data(self, data):
-        NoteOffsetProcGraph.__plot_hit_offsets(self, data)
+    def _plot_data(self, selection):
+        NoteOffsetProcGraph.__plot_hit_offsets(self, selection)
 
 
-    def __plot_hit_offsets(self, data):
-        # Filter out everything but press releated scorings
-        score_filter = (data[:, Data.HIT_TYPE] == ManiaScoreData.TYPE_HITP) | \
-                       (data[:, Data.HIT_TYPE] == ManiaScoreData.TYPE_MISSP)
-        data = data[score_filter]
+    def __plot_hit_offsets(self, selection):
+        # Grouped by note in one pass over the hits
+        counts, means, stddevs = selection.note_offset_stats
 
-        # Extract timings and hit_offsets
-        plays = np.unique(data[:, Data.TIMESTAMP])
-        hit_offsets = data[:, Data.OFFSETS]
-
-        note_idxs = np.arange(int(hit_offsets.shape[0]/plays.shape[0]))
-        num = np.tile(note_idxs, plays.shape[0])
-
-        means = np.zeros(note_idxs.shape[0])
-        stddevs = np.zeros(note_idxs.shape[0])
-
-        miss_filter = \
-            (data[:, Data.HIT_TYPE] == ManiaScoreData.TYPE_HITP)
-
-        for x in note_idxs:
-            offsets = hit_offsets[(num == x) & miss_filter]
-            if offsets.shape[0] == 0:
-                continue
-
-            means[x]   = np.mean(offsets)
-            stddevs[x] = np.std(offsets)
+        note_idxs = np.arange(selection.num_notes)
 
         # Calculate view
         xMin = -1
-        xMax = np.max(num) + 1
+        xMax = np.max(note_idxs) + 1
         yMax = np.max(means+3*stddevs)
         yMin = np.min(means-3*stddevs)
 
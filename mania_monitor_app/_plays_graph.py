@@ -44,12 +44,12 @@ class PlaysGraph():
         self.graphs[self.__id]['widget'].addItem(self.__region_plot)
 
 
-    def _plot_data(self, data):
-        PlaysGraph.__plot_plays(self, data)
+    def _plot_data(self, selection):
+        PlaysGraph.__plot_plays(self, selection.plays)
 
 
-    def __plot_plays(self, data):
-        hit_timestamps = np.unique(data[:, Data.TIMESTAMP])
+    def __plot_plays(self, plays):
+        hit_timestamps = plays['timestamp']
 
         # Calculate view
         xMin = min(hit_timestamps) - 100
@@ -0,0 +1,172 @@
+import functools
+
+import numpy as np
+
+from osu_analysis import ManiaScoreData
+from osu_performance_recorder import Data
+
+
+class Selection():
+    '''
+    The plays of the selected map, as the graphs get them. A new one is made each time
+    a map is selected or a replay comes in.
+
+    Filters and indexes the graphs need are made the first time one asks for them and
+    kept for the others.
+    '''
+
+    def __init__(self, data, plays, get_features=None):
+        self.data  = data
+        self.plays = plays
+
+        # Returns the features of the plays at the given idxs. Features are only loaded
+        # for the plays a graph asks for.
+        self.__get_features = get_features
+
+
+    @property
+    def num_plays(self):
+        return self.plays.shape[0]
+
+
+    @functools.cached_property
+    def latest(self):
+        ''' The latest play on its own '''
+        return self.get_play(-1)
+
+
+    @functools.cached_property
+    def first(self):
+        ''' The first play on its own '''
+        return self.get_play(0)
+
+
+    @functools.cached_property
+    def features(self):
+        ''' `NoteFeatures` of every note of every play, None if there are none '''
+        if isinstance(self.__get_features, type(None)):
+            return None
+
+        return self.__get_features(np.arange(self.num_plays))
+
+
+    def get_play(self, idx):
+        idx   = idx % self.num_plays
+        play  = self.plays[idx : idx + 1].copy()
+        start = int(play['start'][0])
+        end   = int(play['end'][0])
+
+        play['start'] -= start
+        play['end']   -= start
+
+        get_features = None
+        if not isinstance(self.__get_features, type(None)):
+            get_features = lambda play_idxs: self.__get_features(np.asarray(play_idxs) + idx)
+
+        return Selection(self.data[start:end], play, get_features)
+
+
+    @functools.cached_property
+    def is_hit(self):
+        ''' Rows that are press hits '''
+        return self.data[:, Data.HIT_TYPE] == ManiaScoreData.TYPE_HITP
+
+
+    @functools.cached_property
+    def is_miss(self):
+        ''' Rows that are missed presses '''
+        return self.data[:, Data.HIT_TYPE] == ManiaScoreData.TYPE_MISSP
+
+
+    @functools.cached_property
+    def hits(self):
+        return self.data[self.is_hit]
+
+
+    @functools.cached_property
+    def misses(self):
+        return self.data[self.is_miss]
+
+
+    @functools.cached_property
+    def notes(self):
+        ''' Press hits and misses, one row per note of each play '''
+        return self.data[self.is_hit | self.is_miss]
+
+
+    @functools.cached_property
+    def note_is_hit(self):
+        return self.notes[:, Data.HIT_TYPE] == ManiaScoreData.TYPE_HITP
+
+
+    @functools.cached_property
+    def note_idxs(self):
+        ''' Index of each note in its play '''
+        num_notes = self.plays['num_notes']
+        starts    = np.cumsum(num_notes) - num_notes
+        return np.arange(self.notes.shape[0]) - np.repeat(starts, num_notes)
+
+
+    @functools.cached_property
+    def num_notes(self):
+        ''' Notes in the map '''
+        return int(np.max(self.plays['num_notes'], initial=0))
+
+
+    @functools.cached_property
+    def hit_note_idxs(self):
+        ''' `note_idxs` of the press hits, in the same order as `hits` '''
+        return self.note_idxs[self.note_is_hit]
+
+
+    @functools.cached_property
+    def note_offset_stats(self):
+        '''
+        Count, mean and standard deviation of the press hit offsets of each note,
+        throughout all plays. Notes that were never hit have 0 for all three.
+        '''
+        note_idxs = self.hit_note_idxs
+        offsets   = self.hits[:, Data.OFFSETS]
+
+        counts = np.bincount(note_idxs, minlength=self.num_notes)
+        sums   = np.bincount(note_idxs, weights=offsets, minlength=self.num_notes)
+
+        has_hits = counts != 0
+        means = np.zeros(self.num_notes)
+        means[has_hits] = sums[has_hits] / counts[has_hits]
+
+        # Deviations from the means rather than sums of squares, it keeps the precision
+        devs = offsets - means[note_idxs]
+        stddevs = np.zeros(self.num_notes)
+        stddevs[has_hits] = np.sqrt(np.bincount(note_idxs, weights=devs*devs, minlength=self.num_notes)[has_hits] / counts[has_hits])
+
+        return counts, means, stddevs
+
+
+    def get_note_offset_percentiles(self, percentiles):
+        '''
+        Percentiles of the press hit offsets of each note, throughout all plays, as a
+        (notes, percentiles) array. Interpolated like `np.percentile`. Notes that were
+        never hit are nan.
+        '''
+        percentiles = np.asarray(percentiles, dtype=np.float64)
+        note_idxs   = self.hit_note_idxs
+        offsets     = self.hits[:, Data.OFFSETS]
+        counts, _, _ = self.note_offset_stats
+
+        # One sort puts every note's offsets together, in order
+        offsets = offsets[np.lexsort((offsets, note_idxs))]
+        starts  = np.cumsum(counts) - counts
+
+        pos = (np.maximum(counts, 1)[:, np.newaxis] - 1) * (percentiles[np.newaxis, :] / 100)
+        lo  = np.floor(pos).astype(np.int64)
+        hi  = np.ceil(pos).astype(np.int64)
+
+        has_hits = counts != 0
+        result = np.full((self.num_notes, percentiles.shape[0]), np.nan)
+
+        lo_val = offsets[(starts[:, np.newaxis] + lo)[has_hits]]
+        hi_val = offsets[(starts[:, np.newaxis] + hi)[has_hits]]
+        result[has_hits] = lo_val + (hi_val - lo_val) * (pos - lo)[has_hits]
+
+        return result
@@ -0,0 +1,197 @@
+import os
+import sqlite3
+import threading
+
+from osu_db_reader.osu_db_reader import OsuDbReader
+
+
+
+class MapIndex():
+    '''
+    Index of the maps in osu!.db, for resolving replays and recorded map hashes to maps.
+
+    Lookups are served from in-memory dicts:
+        md5  -> path of the .osu file, relative to the Songs folder
+        md5h -> md5, where md5h is the part of the md5 kept in recorded map hashes
+        path -> md5
+
+    Besides syncing with osu!.db as a whole, single .osu files can be updated as they
+    change on disk with `update_file` and `remove_file`.
+
+    The index is persisted in an SQLite file, so it does not need to be rebuilt
+    from osu!.db on every start. It can be updated from a thread other than the one
+    that looks maps up.
+    '''
+
+    def __init__(self, file_pathname):
+        self.__lock = threading.Lock()
+        self.__db = sqlite3.connect(file_pathname, check_same_thread=False)
+        self.__db.execute('CREATE TABLE IF NOT EXISTS maps (md5 TEXT PRIMARY KEY, md5h TEXT NOT NULL, path TEXT NOT NULL, last_modified INTEGER NOT NULL DEFAULT 0)')
+        self.__db.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)')
+
+        # Indexes made before last modified times were kept
+        columns = [ row[1] for row in self.__db.execute('PRAGMA table_info(maps)') ]
+        if 'last_modified' not in columns:
+            self.__db.execute('ALTER TABLE maps ADD COLUMN last_modified INTEGER NOT NULL DEFAULT 0')
+
+        self.__db.commit()
+
+        self.__maps  = {}
+        self.__md5s  = {}
+        self.__paths = {}
+
+        for md5, md5h, path, last_modified in self.__db.execute('SELECT md5, md5h, path, last_modified FROM maps'):
+            self.__maps[md5] = (path, last_modified)
+            self.__md5s[md5h] = md5
+            self.__paths[path] = md5
+
+
+    def __len__(self):
+        return len(self.__maps)
+
+
+    def get_path(self, md5):
+        entry = self.__maps.get(md5, None)
+        return None if isinstance(entry, type(None)) else entry[0]
+
+
+    def get_md5(self, md5h):
+        return self.__md5s.get(md5h, None)
+
+
+    def get_meta(self, key):
+        with self.__lock:
+            row = self.__db.execute('SELECT value FROM meta WHERE key = ?', (key, )).fetchone()
+
+        return None if isinstance(row, type(None)) else row[0]
+
+
+    def set_meta(self, key, value):
+        with self.__lock, self.__db:
+            self.__db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+
+    def sync(self, osu_db_pathname, progress=None):
+        '''
+        Updates the index from osu!.db if osu!.db changed since the last sync. Returns
+        what `update` does, or None if nothing needed to be done. `progress` is passed
+        on to the osu!.db reader.
+        '''
+        num_beatmaps_read = OsuDbReader.get_num_beatmaps(osu_db_pathname)
+        num_beatmaps_save = self.get_meta('num_maps')
+
+        last_modified_read = os.stat(osu_db_pathname).st_mtime
+        last_modified_save = self.get_meta('last_modified')
+
+        num_maps_changed = num_beatmaps_read != num_beatmaps_save
+        osu_db_modified = last_modified_read != last_modified_save
+
+        if not (num_maps_changed or osu_db_modified or len(self) == 0):
+            return None
+
+        # Only maps that were added, removed, moved or modified since the last sync are written
+        maps = OsuDbReader.get_beatmap_md5_paths(osu_db_pathname, progress=progress)
+        counts = self.update(maps)
+
+        # The header count was only read to see if anything changed; the parse is the full count
+        self.set_meta('num_maps', len(maps))
+        self.set_meta('last_modified', last_modified_read)
+
+        return counts
+
+
+    def update(self, maps):
+        '''
+        Brings the index in line with `maps`, a list of { 'md5', 'md5h', 'path', 'last_modified' }
+        dicts as read from osu!.db. Only maps that were added, removed, or moved or modified
+        are written. Returns the number of each.
+        '''
+        new_maps = { m['md5'] : m for m in maps }
+
+        # Locked throughout, files can be updated from another thread meanwhile
+        with self.__lock:
+            inserts = [ m for md5, m in new_maps.items() if md5 not in self.__maps ]
+            deletes = [ md5 for md5 in self.__maps if md5 not in new_maps ]
+            moves   = [ m for md5, m in new_maps.items() if (md5 in self.__maps) and (self.__maps[md5] != (m['path'], m['last_modified'])) ]
+
+            with self.__db:
+                self.__db.executemany('DELETE FROM maps WHERE md5 = ?', [ (md5, ) for md5 in deletes ])
+                self.__db.executemany('INSERT OR REPLACE INTO maps (md5, md5h, path, last_modified) VALUES (?, ?, ?, ?)',
+                    [ (m['md5'], m['md5h'], m['path'], m['last_modified']) for m in inserts + moves ])
+
+            for md5 in deletes:
+                self.__remove(md5)
+
+            for m in inserts + moves:
+                self.__add(m['md5'], m['md5h'], m['path'], m['last_modified'])
+
+        return len(inserts), len(deletes), len(moves)
+
+
+    def update_file(self, md5, path, last_modified):
+        '''
+        Sets the map at `path` to be the one with `md5`, replacing whatever map was there.
+        `last_modified` is in osu!.db's units (.NET ticks). Returns False if the index
+        already had it.
+        '''
+        with self.__lock:
+            old_md5 = self.__paths.get(path, None)
+            if (old_md5 == md5) and (self.__maps[md5] == (path, last_modified)):
+                return False
+
+            with self.__db:
+                if not isinstance(old_md5, type(None)) and (old_md5 != md5):
+                    self.__db.execute('DELETE FROM maps WHERE md5 = ?', (old_md5, ))
+
+                self.__db.execute('INSERT OR REPLACE INTO maps (md5, md5h, path, last_modified) VALUES (?, ?, ?, ?)',
+                    (md5, md5[-16:-4], path, last_modified))
+
+            if not isinstance(old_md5, type(None)) and (old_md5 != md5):
+                self.__remove(old_md5)
+
+            self.__add(md5, md5[-16:-4], path, last_modified)
+
+        return True
+
+
+    def remove_file(self, path):
+        '''
+        Removes the map at `path`. Returns False if there was none.
+        '''
+        with self.__lock:
+            md5 = self.__paths.get(path, None)
+            if isinstance(md5, type(None)):
+                return False
+
+            with self.__db:
+                self.__db.execute('DELETE FROM maps WHERE md5 = ?', (md5, ))
+
+            self.__remove(md5)
+
+        return True
+
+
+    def __add(self, md5, md5h, path, last_modified):
+        # A map that moved leaves its old path behind
+        old_entry = self.__maps.get(md5, None)
+        if not isinstance(old_entry, type(None)) and (self.__paths.get(old_entry[0], None) == md5):
+            del self.__paths[old_entry[0]]
+
+        self.__maps[md5]   = (path, last_modified)
+        self.__md5s[md5h]  = md5
+        self.__paths[path] = md5
+
+
+    def __remove(self, md5):
+        path, last_modified = self.__maps.pop(md5)
+
+        if self.__md5s.get(md5[-16:-4], None) == md5:
+            del self.__md5s[md5[-16:-4]]
+
+        if self.__paths.get(path, None) == md5:
+            del self.__paths[path]
+
+
+    def close(self):
+        with self.__lock:
+            self.__db.close()
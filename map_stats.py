@@ -0,0 +1,89 @@
+import csv
+import datetime
+
+import numpy as np
+
+from osu_analysis import ManiaScoreData
+from recording_file import Data
+
+
+
+class MapStats():
+    '''
+    Per-map statistics of recorded plays, one row per map and mods. Offsets are of
+    press hits, in ms; misses are missed presses.
+    '''
+
+    FIELDS = [
+        'map', 'mods', 'name', 'plays', 'notes', 'misses',
+        'mean_offset', 'std_offset', 'ur',
+        'last_mean_offset', 'last_std_offset', 'last_played',
+    ]
+
+    @staticmethod
+    def get_stats(dataset, map_index=None):
+        '''
+        Returns a dict of `FIELDS` for each map in the dataset. Maps are named from
+        `map_index` if given and the map is in it.
+        '''
+        return [ MapStats.get_map_stats(dataset, map_key, map_index) for map_key in dataset.get_maps() ]
+
+
+    @staticmethod
+    def get_map_stats(dataset, map_key, map_index=None):
+        data, plays = dataset.select(map_key)
+
+        hit_types = data[:, Data.HIT_TYPE]
+        is_hit    = (hit_types == ManiaScoreData.TYPE_HITP)
+        offsets   = data[is_hit, Data.OFFSETS]
+
+        last_data = data[plays['start'][-1] : plays['end'][-1]]
+        last_offsets = last_data[last_data[:, Data.HIT_TYPE] == ManiaScoreData.TYPE_HITP, Data.OFFSETS]
+
+        std_offset = np.std(offsets) if offsets.shape[0] != 0 else np.nan
+
+        return {
+            'map'    : f'{int(map_key) >> 16:012x}',
+            'mods'   : MapStats.get_mods_name(int(map_key) & 0xFFFF),
+            'name'   : MapStats.get_map_name(int(map_key) >> 16, map_index),
+            'plays'  : plays.shape[0],
+            'notes'  : int(np.sum(plays['num_notes'])),
+            'misses' : int(np.count_nonzero(hit_types == ManiaScoreData.TYPE_MISSP)),
+
+            'mean_offset' : np.mean(offsets) if offsets.shape[0] != 0 else np.nan,
+            'std_offset'  : std_offset,
+            'ur'          : std_offset*10,
+
+            'last_mean_offset' : np.mean(last_offsets) if last_offsets.shape[0] != 0 else np.nan,
+            'last_std_offset'  : np.std(last_offsets) if last_offsets.shape[0] != 0 else np.nan,
+            'last_played'      : datetime.datetime.fromtimestamp(plays['timestamp'][-1]).isoformat(timespec='seconds'),
+        }
+
+
+    @staticmethod
+    def get_mods_name(mods):
+        name = ''
+        if mods & (1 << 0): name += 'DT'
+        if mods & (1 << 1): name += 'HT'
+        return name
+
+
+    @staticmethod
+    def get_map_name(map_hash, map_index):
+        if isinstance(map_index, type(None)):
+            return ''
+
+        md5 = map_index.get_md5(f'{map_hash:012x}')
+        if isinstance(md5, type(None)):
+            return ''
+
+        return map_index.get_path(md5).split('/')[-1]
+
+
+    @staticmethod
+    def write_csv(map_stats, f):
+        writer = csv.DictWriter(f, fieldnames=MapStats.FIELDS)
+        writer.writeheader()
+
+        for row in map_stats:
+            writer.writerow({ key : (f'{value:.3f}' if isinstance(value, float) else value) for key, value in row.items() })
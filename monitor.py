@@ -1,11 +1,28 @@
 import watchdog.observers
 import watchdog.events
 import os
+import time
+import threading
+import traceback
 
 
 
 class Monitor(watchdog.observers.Observer):
 
+    # Files that are still being written are checked this often. A file is taken as
+    # written when it is closed. Where the platform doesn't tell when files are closed,
+    # it's taken as written once its size stays the same for `STABLE_TIME`; where it does,
+    # only a close that got lost has to wait the longer `CLOSE_TIMEOUT`.
+    POLL_INTERVAL = 0.02
+    STABLE_TIME   = 0.1
+    CLOSE_TIMEOUT = 5
+
+    # Files that stay empty this long are given up on
+    EMPTY_TIMEOUT = 10
+
+    # Files handed to their callback are remembered this long
+    WRITTEN_TIME = 60
+
     def __init__(self, osu_path):
         watchdog.observers.Observer.__init__(self)
 
@@ -14,11 +31,28 @@ class Monitor(watchdog.observers.Observer):
 
         self.osu_path = osu_path
         self.monitors = {}
+
+        # path -> [ callback, last size, time of last size change, closed ]
+        self.__writing = {}
+
+        # path -> ((size, mtime), time handed over) of files that were handed to their
+        # callback. Events for a file can keep coming after it's done, those are ignored.
+        self.__written = {}
+
+        # Only inotify reports files being closed. Elsewhere, a close event coming in at
+        # all shows that the platform has them.
+        self.__has_close_events = any('Inotify' in cls.__name__ for cls in type(self).__mro__)
+        self.__write_lock  = threading.Lock()
+        self.__write_event = threading.Event()
+
+        self.__write_thread = threading.Thread(target=self.__poll_writes, daemon=True)
+        self.__write_thread.start()
+
         self.start()
 
 
     def __del__(self):
-        self.stop()   
+        self.stop()
 
 
     def create_replay_monitor(self, name, callback):
@@ -26,15 +60,190 @@ class Monitor(watchdog.observers.Observer):
         if not os.path.exists(replay_path):
             raise Exception(f'"{replay_path}" does not exist!')
 
+        on_write  = lambda path: self.__wait_for_write(path, callback)
+        on_done   = lambda path: self.__finish_write(path)
+        on_closed = lambda path: self.__handle_closed(path)
+
         class EventHandler(watchdog.events.FileSystemEventHandler):
             def on_created(self, event):
                 if '.osr' in event.src_path:
-                    callback(event.src_path)
+                    on_write(event.src_path)
+
+            def on_modified(self, event):
+                # Created events can get lost or come late
+                if '.osr' in event.src_path:
+                    on_write(event.src_path)
+
+            def on_closed(self, event):
+                # Only delivered on some platforms
+                if '.osr' in event.src_path:
+                    on_closed(event.src_path)
+
+            def on_moved(self, event):
+                # Written elsewhere and moved in; it's already complete
+                if '.osr' in event.dest_path:
+                    on_write(event.dest_path)
+                    on_done(event.dest_path)
 
         print(f'Created file creation monitor for {self.osu_path}/data/r')
         self.monitors[name] = self.schedule(EventHandler(), replay_path, recursive=False)
 
 
     def create_map_monitor(self, name, callback, beatmap_path):
-        # TODO
-        pass
\ No newline at end of file
+        '''
+        Watches the .osu files in `beatmap_path` and its subfolders. `callback` is called
+        with the path of a .osu file once it is written, or once it is gone - it's up to
+        the callback to check which.
+        '''
+        if not os.path.exists(beatmap_path):
+            raise Exception(f'"{beatmap_path}" does not exist!')
+
+        on_write  = lambda path: self.__wait_for_write(path, callback)
+        on_done   = lambda path: self.__finish_write(path)
+        on_closed = lambda path: self.__handle_closed(path)
+
+        def on_removed(path):
+            # Done right away, there is nothing to wait for
+            on_write(path)
+            on_done(path)
+
+        class EventHandler(watchdog.events.FileSystemEventHandler):
+            def on_created(self, event):
+                if (not event.is_directory) and event.src_path.endswith('.osu'):
+                    on_write(event.src_path)
+
+            def on_modified(self, event):
+                if (not event.is_directory) and event.src_path.endswith('.osu'):
+                    on_write(event.src_path)
+
+            def on_closed(self, event):
+                if (not event.is_directory) and event.src_path.endswith('.osu'):
+                    on_closed(event.src_path)
+
+            def on_deleted(self, event):
+                if (not event.is_directory) and event.src_path.endswith('.osu'):
+                    on_removed(event.src_path)
+
+            def on_moved(self, event):
+                # Moving a map set's folder gives a moved event for each file in it too
+                if event.is_directory:
+                    return
+
+                if event.src_path.endswith('.osu'):
+                    on_removed(event.src_path)
+
+                if event.dest_path.endswith('.osu'):
+                    on_write(event.dest_path)
+                    on_done(event.dest_path)
+
+        print(f'Created map monitor for {beatmap_path}')
+        self.monitors[name] = self.schedule(EventHandler(), beatmap_path, recursive=True)
+
+
+    @staticmethod
+    def __get_stamp(path):
+        try: stat = os.stat(path)
+        except OSError:
+            return None
+
+        return (stat.st_size, stat.st_mtime_ns)
+
+
+    def __wait_for_write(self, path, callback):
+        stamp = Monitor.__get_stamp(path)
+
+        with self.__write_lock:
+            if path in self.__writing:
+                return
+
+            if (path in self.__written) and (self.__written[path][0] == stamp):
+                return
+
+            self.__writing[path] = [ callback, -1, time.monotonic(), False ]
+            self.__write_event.set()
+
+
+    def __handle_closed(self, path):
+        with self.__write_lock:
+            self.__has_close_events = True
+
+        self.__finish_write(path)
+
+
+    def __finish_write(self, path):
+        # Callbacks are all made from the poll thread so they never hold up the observer
+        with self.__write_lock:
+            if path in self.__writing:
+                self.__writing[path][3] = True
+                self.__write_event.set()
+
+
+    def __poll_writes(self):
+        while True:
+            self.__write_event.wait()
+
+            with self.__write_lock:
+                if len(self.__writing) == 0:
+                    self.__write_event.clear()
+                    continue
+
+                now  = time.monotonic()
+                done = []
+
+                stable_time = Monitor.CLOSE_TIMEOUT if self.__has_close_events else Monitor.STABLE_TIME
+
+                for path, entry in list(self.__writing.items()):
+                    try: size = os.path.getsize(path)
+                    except OSError:
+                        # Deleted before it was done; moved and deleted files are closed already
+                        if entry[3]:
+                            done.append((path, self.__writing.pop(path)[0]))
+                        else:
+                            del self.__writing[path]
+                        continue
+
+                    if size == 0:
+                        # Created, but never written to. Closing it doesn't make it written,
+                        # it may be opened again.
+                        entry[3] = False
+
+                        if entry[1] != 0:
+                            entry[1] = 0
+                            entry[2] = now
+
+                        if now - entry[2] >= Monitor.EMPTY_TIMEOUT:
+                            del self.__writing[path]
+                        continue
+
+                    if entry[3]:
+                        done.append((path, self.__writing.pop(path)[0]))
+                        continue
+
+                    if size != entry[1]:
+                        entry[1] = size
+                        entry[2] = now
+                        continue
+
+                    if now - entry[2] >= stable_time:
+                        done.append((path, self.__writing.pop(path)[0]))
+
+            for path, callback in done:
+                self.__written_callback(path, callback)
+
+            time.sleep(Monitor.POLL_INTERVAL)
+
+
+    def __written_callback(self, path, callback):
+        with self.__write_lock:
+            now = time.monotonic()
+
+            for written_path, (_, written_time) in list(self.__written.items()):
+                if now - written_time >= Monitor.WRITTEN_TIME:
+                    del self.__written[written_path]
+
+            self.__written[path] = (Monitor.__get_stamp(path), now)
+
+        # An error in one file's callback shouldn't stop the others from being watched
+        try: callback(path)
+        except Exception:
+            traceback.print_exc()
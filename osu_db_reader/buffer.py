@@ -83,7 +83,7 @@ class WriteBuffer:
 
     def __init__(self):
         self.offset = 0
-        self.data = b''
+        self.data = bytearray()
 
 
     def write_bool(self, data: bool):
@@ -114,13 +114,24 @@ class WriteBuffer:
         self.data += struct.pack('<Q', data)
 
 
+    # osu specific
+    def write_int_double(self, integer: int, double: float):
+        self.data += struct.pack('<BIBd', 0x08, integer, 0x0d, double)
+
+
+    def write_timing_point(self, bpm: float, offset: float, inherited: bool):
+        self.data += struct.pack('<dd?', bpm, offset, inherited)
+
+
     def write_string(self, data: str):
-        if len(data) <= 0: 
+        if len(data) <= 0:
             self.write_ubyte(0x0)
             return
 
+        # Length is of the encoded bytes, not of the characters
+        data = data.encode('utf-8')
+
         self.write_ubyte(0x0b)
-        strlen = b''
         value = len(data)
 
         while value != 0:
@@ -130,11 +141,10 @@ class WriteBuffer:
             if (value != 0):
                 byte |= 0x80
 
-            strlen += struct.pack('<B', byte)
+            self.data.append(byte)
 
-        self.data += strlen
-        self.data += struct.pack(f'<{len(data)}s', data.encode('utf-8'))
+        self.data += data
 
 
     def clear_buffer(self):
-        self.data = b''
\ No newline at end of file
+        self.data = bytearray()
@@ -1,116 +1,174 @@
 # from https://github.com/jaasonw/osu-db-tools/blob/master/osu_to_sqlite.py
 
-from osu_db_reader.buffer import ReadBuffer
+import struct
 
 
 class OsuDbReader():
-
-    def get_beatmap_md5_paths(filename):
+    '''
+    Reads osu!.db in one go. The whole file is read into memory once and fields are
+    decoded straight out of it with precompiled structs. Only the fields that are
+    used get decoded; fixed size fields and blocks (star ratings, timing points) are
+    skipped over by their size.
+    '''
+
+    UINT   = struct.Struct('<I')
+    ULONG  = struct.Struct('<Q')
+    HEADER = struct.Struct('<II?Q')   # version, folder count, account unlocked, unlock date
+
+    # Entries of db versions before this start with their size
+    VERSION_ENTRY_SIZE = 20191106
+
+    # Star ratings are int-double pairs, and int-float pairs from this db version on
+    VERSION_STAR_FLOAT = 20250107
+
+    # Sizes of the fixed size parts of an entry
+    SIZE_DIFFICULTY     = 1 + 2*3 + 8 + 4*4 + 8   # ranked status, object counts, last modified, AR/CS/HP/OD, SV
+    SIZE_TIMES          = 4*3                     # drain, total and preview time
+    SIZE_TIMING_POINT   = 8 + 8 + 1               # bpm, offset, inherited
+    SIZE_IDS            = 4*3 + 1*4 + 2 + 4 + 1   # beatmap/set/thread id, grades, local offset, stack leniency, gamemode
+    SIZE_ONLINE_OFFSET  = 2
+    SIZE_PLAYED         = 1 + 8 + 1               # unplayed, last played, is osz2
+    SIZE_TAIL           = 8 + 1*5 + 4 + 1         # last checked, ignore/disable flags, last modified, scroll speed
+
+    # How many maps are read between progress reports
+    PROGRESS_STEP = 1000
+
+    def get_beatmap_md5_paths(filename, progress=None):
+        '''
+        `progress`, if given, is called with (maps read, total maps) as the maps are read
+        '''
         data = []
 
         with open(filename, 'rb') as db:
-            version = ReadBuffer.read_uint(db)
-            folder_count = ReadBuffer.read_uint(db)
-            account_unlocked = ReadBuffer.read_bool(db)
-            # skip this datetime
-            ReadBuffer.read_uint(db)
-            ReadBuffer.read_uint(db)
-            name = ReadBuffer.read_string(db)
-            num_beatmaps = ReadBuffer.read_uint(db)
-
-            for _ in range(num_beatmaps):
-                artist = ReadBuffer.read_string(db)
-                artist_unicode = ReadBuffer.read_string(db)
-                song_title = ReadBuffer.read_string(db)
-                song_title_unicode = ReadBuffer.read_string(db)
-                mapper = ReadBuffer.read_string(db)
-                difficulty = ReadBuffer.read_string(db)
-                audio_file = ReadBuffer.read_string(db)
-                md5_hash = ReadBuffer.read_string(db)
-                map_file = ReadBuffer.read_string(db)
-                ranked_status = ReadBuffer.read_ubyte(db)
-                num_hitcircles = ReadBuffer.read_ushort(db)
-                num_sliders = ReadBuffer.read_ushort(db)
-                num_spinners = ReadBuffer.read_ushort(db)
-                last_modified = ReadBuffer.read_ulong(db)
-                approach_rate = ReadBuffer.read_float(db)
-                circle_size = ReadBuffer.read_float(db)
-                hp_drain = ReadBuffer.read_float(db)
-                overall_difficulty = ReadBuffer.read_float(db)
-                slider_velocity = ReadBuffer.read_double(db)
-                
-                i = ReadBuffer.read_uint(db)
-                for _ in range(i):
-                    ReadBuffer.read_int_double(db)
-
-                i = ReadBuffer.read_uint(db)
-                for _ in range(i):
-                    ReadBuffer.read_int_double(db)
-
-                i = ReadBuffer.read_uint(db)
-                for _ in range(i):
-                    ReadBuffer.read_int_double(db)
-
-                i = ReadBuffer.read_uint(db)
-                for _ in range(i):
-                    ReadBuffer.read_int_double(db)
-
-                drain_time = ReadBuffer.read_uint(db)
-                total_time = ReadBuffer.read_uint(db)
-                preview_time = ReadBuffer.read_uint(db)
-
-                # skip timing points
-                # i = ReadBuffer.read_uint(db)
-
-                for _ in range(ReadBuffer.read_uint(db)):
-                    ReadBuffer.read_timing_point(db)
-
-                beatmap_id = ReadBuffer.read_uint(db)
-                beatmap_set_id = ReadBuffer.read_uint(db)
-                thread_id = ReadBuffer.read_uint(db)
-                grade_standard = ReadBuffer.read_ubyte(db)
-                grade_taiko = ReadBuffer.read_ubyte(db)
-                grade_ctb = ReadBuffer.read_ubyte(db)
-                grade_mania = ReadBuffer.read_ubyte(db)
-                local_offset = ReadBuffer.read_ushort(db)
-                stack_leniency = ReadBuffer.read_float(db)
-                gameplay_mode = ReadBuffer.read_ubyte(db)
-                song_source = ReadBuffer.read_string(db)
-                song_tags = ReadBuffer.read_string(db)
-                online_offset = ReadBuffer.read_ushort(db)
-                title_font = ReadBuffer.read_string(db)
-                is_unplayed = ReadBuffer.read_bool(db)
-                last_played = ReadBuffer.read_ulong(db)
-                is_osz2 = ReadBuffer.read_bool(db)
-                folder_name = ReadBuffer.read_string(db)
-                last_checked = ReadBuffer.read_ulong(db)
-                ignore_sounds = ReadBuffer.read_bool(db)
-                ignore_skin = ReadBuffer.read_bool(db)
-                disable_storyboard = ReadBuffer.read_bool(db)
-                disable_video = ReadBuffer.read_bool(db)
-                visual_override = ReadBuffer.read_bool(db)
-                last_modified2 = ReadBuffer.read_uint(db)
-                scroll_speed = ReadBuffer.read_ubyte(db)
-
-                data.append({ 
-                    'md5'   : md5_hash,
-                    'md5h'  : md5_hash[-16:-4],
-                    'path' : f'{folder_name}/{map_file}' 
-                })
-                print(data[-1])
-            
+            buf = memoryview(db.read())
+
+        version, pos, num_beatmaps = OsuDbReader.__read_header(buf)
+        star_size = (1 + 4 + 1 + 4) if version >= OsuDbReader.VERSION_STAR_FLOAT else (1 + 4 + 1 + 8)
+
+        uint_unpack  = OsuDbReader.UINT.unpack_from
+        ulong_unpack = OsuDbReader.ULONG.unpack_from
+        skip_strings = OsuDbReader.__skip_strings
+        read_string  = OsuDbReader.__read_string
+
+        for i in range(num_beatmaps):
+            if (not isinstance(progress, type(None))) and (i % OsuDbReader.PROGRESS_STEP == 0):
+                progress(i, num_beatmaps)
+
+            if version < OsuDbReader.VERSION_ENTRY_SIZE:
+                pos += 4
+
+            # artist, artist unicode, title, title unicode, mapper, difficulty, audio file
+            pos = skip_strings(buf, pos, 7)
+
+            md5_hash, pos = read_string(buf, pos)
+            map_file, pos = read_string(buf, pos)
+
+            # Last modified comes after the ranked status and object counts
+            last_modified = ulong_unpack(buf, pos + 1 + 2*3)[0]
+            pos += OsuDbReader.SIZE_DIFFICULTY
+
+            # Star ratings for each gamemode
+            for _ in range(4):
+                pos += 4 + uint_unpack(buf, pos)[0]*star_size
+
+            pos += OsuDbReader.SIZE_TIMES
+            pos += 4 + uint_unpack(buf, pos)[0]*OsuDbReader.SIZE_TIMING_POINT
+            pos += OsuDbReader.SIZE_IDS
+
+            # song source, song tags
+            pos = skip_strings(buf, pos, 2)
+            pos += OsuDbReader.SIZE_ONLINE_OFFSET
+
+            # title font
+            pos = skip_strings(buf, pos, 1)
+            pos += OsuDbReader.SIZE_PLAYED
+
+            folder_name, pos = read_string(buf, pos)
+            pos += OsuDbReader.SIZE_TAIL
+
+            data.append({
+                'md5'   : md5_hash,
+                'md5h'  : md5_hash[-16:-4],
+                'path' : f'{folder_name}/{map_file}',
+                'last_modified' : last_modified,
+            })
+
+        if not isinstance(progress, type(None)):
+            progress(num_beatmaps, num_beatmaps)
+
         return data
 
 
     def get_num_beatmaps(filename):
         with open(filename, 'rb') as db:
-            version = ReadBuffer.read_uint(db)
-            folder_count = ReadBuffer.read_uint(db)
-            account_unlocked = ReadBuffer.read_bool(db)
-            # skip this datetime
-            ReadBuffer.read_uint(db)
-            ReadBuffer.read_uint(db)
-            name = ReadBuffer.read_string(db)
-            num_beatmaps = ReadBuffer.read_uint(db)
-
-        return num_beatmaps
\ No newline at end of file
+            # Only the header is needed. Its one variable size field is the player name,
+            # which is well within this.
+            buf = memoryview(db.read(1024))
+
+        return OsuDbReader.__read_header(buf)[2]
+
+
+    @staticmethod
+    def __read_header(buf):
+        '''
+        Returns the db version, where the first entry starts, and the number of entries
+        '''
+        version = OsuDbReader.HEADER.unpack_from(buf, 0)[0]
+
+        # player name
+        pos = OsuDbReader.__skip_strings(buf, OsuDbReader.HEADER.size, 1)
+        num_beatmaps = OsuDbReader.UINT.unpack_from(buf, pos)[0]
+
+        return version, pos + 4, num_beatmaps
+
+
+    @staticmethod
+    def __read_strlen(buf, pos):
+        '''
+        Returns the length of the string at `pos` and where its bytes start
+        '''
+        if buf[pos] != 0x0b:
+            return 0, pos + 1
+
+        pos += 1
+
+        # uleb128 length, nearly always a single byte
+        byte = buf[pos]
+        if byte < 0x80:
+            return byte, pos + 1
+
+        strlen, shift = 0, 0
+        while True:
+            byte = buf[pos]
+            pos += 1
+
+            strlen |= ((byte & 0x7F) << shift)
+            if (byte & 0x80) == 0:
+                return strlen, pos
+
+            shift += 7
+
+
+    @staticmethod
+    def __skip_strings(buf, pos, num):
+        for _ in range(num):
+            # Same as __read_strlen, with the common cases inline
+            if buf[pos] != 0x0b:
+                pos += 1
+                continue
+
+            strlen = buf[pos + 1]
+            if strlen < 0x80:
+                pos += 2 + strlen
+                continue
+
+            strlen, pos = OsuDbReader.__read_strlen(buf, pos)
+            pos += strlen
+
+        return pos
+
+
+    @staticmethod
+    def __read_string(buf, pos):
+        strlen, pos = OsuDbReader.__read_strlen(buf, pos)
+        return str(buf[pos : pos + strlen], 'utf-8'), pos + strlen
@@ -0,0 +1,331 @@
+import os
+import sys
+import time
+import datetime
+import argparse
+import threading
+
+from recording_file import RecordingFile, RecordingSet, NoteFeatures, Data
+from ingest_journal import IngestJournal
+from seen_replays import SeenReplays
+from map_index import MapIndex
+from beatmap_cache import BeatmapCache
+from replay_processor import ReplayProcessor
+from monitor import Monitor
+from ingest_queue import IngestQueue
+from map_stats import MapStats
+
+
+
+class Recorder():
+    '''
+    Records the mania replays osu! saves. Has nothing to do with Qt, so it can run
+    without a display.
+
+    `callback` is called with (map index, dataset snapshot, title) when there is new
+    data, and `progress_callback` with (maps read, total maps) while the map index is
+    brought up to date. Both are called from the recorder's threads.
+    '''
+
+    SAVE_FILE = 'data/recording_v4_{date}.rec'
+
+    # Replays waiting to be recorded before the monitor is held up
+    MAX_QUEUED = 64
+
+    # osu!.db keeps times as .NET ticks
+    TICKS_PER_SECOND = 10000000
+    TICKS_UNIX_EPOCH = 621355968000000000
+
+    def __init__(self, osu_path, callback, progress_callback=None):
+        self.__callback          = callback
+        self.__progress_callback = progress_callback
+
+        os.makedirs('data', exist_ok=True)
+
+        # For resolving replays to maps
+        self.map_index = MapIndex('data/maps.db')
+        self.beatmap_cache = BeatmapCache('data/beatmap_cache')
+
+        self.dataset = None
+        self.__pathnames = []
+        self.__session_pathname = None
+
+        self.journal = IngestJournal('data/ingest.journal')
+
+        # Replays already in the recordings, so they are not recorded again
+        self.seen_replays = SeenReplays('data/seen_replays.txt')
+
+        # Replays are recorded one at a time off the monitor's thread. The queue is held
+        # until the map index is brought up to date; replays that come in meanwhile wait in it.
+        self.__ingest_lock = threading.RLock()
+        self.ingest_queue  = IngestQueue(self.__record_replay, max_size=Recorder.MAX_QUEUED, paused=True)
+
+        # What `callback` was last given to read from. It doesn't change as replays are
+        # recorded, a new one is sent along with each new replay.
+        self.snapshot = None
+
+        self.osu_path  = osu_path
+        self.processor = ReplayProcessor(osu_path, self.map_index, self.beatmap_cache)
+
+        self.monitor = Monitor(osu_path)
+        self.monitor.create_replay_monitor('Replay Grapher', self.__handle_new_replay)
+
+        # Indexing a large osu!.db takes a while, the app is usable in the meantime
+        self.__index_thread = threading.Thread(target=self.__index_maps, daemon=True)
+        self.__index_thread.start()
+
+
+    def __del__(self):
+        self.close()
+
+
+    def close(self):
+        # Replays still waiting are left for a backfill
+        self.ingest_queue.close()
+        self.monitor.stop()
+
+        with self.__ingest_lock:
+            if not isinstance(self.dataset, type(None)):
+                self.dataset.close()
+                self.dataset = None
+
+            self.journal.close()
+            self.seen_replays.close()
+            self.map_index.close()
+
+
+    def new_file(self):
+        with self.__ingest_lock:
+            self.__new_file()
+
+
+    def __new_file(self):
+        self.__new_session()
+        self.__open([])
+
+
+    def __new_session(self):
+        # Plays are only ever recorded into the session's own recording. Everything
+        # else is opened read-only.
+        date = datetime.datetime.now()
+        self.__session_pathname = Recorder.SAVE_FILE.format(date=f'{date.year}_{date.month}_{date.day}_{date.hour}_{date.minute}_{date.second}')
+
+
+    def open_files(self, pathnames):
+        '''
+        Opens recording files, or folders of them, as one dataset
+        '''
+        with self.__ingest_lock:
+            self.__open(pathnames)
+
+
+    def __open(self, pathnames):
+        if not isinstance(self.dataset, type(None)):
+            self.dataset.close()
+
+        # The session's recording is opened along with them, if there is one yet
+        self.__pathnames = list(pathnames)
+        self.dataset = RecordingSet.open(self.__pathnames, write_pathname=self.__session_pathname)
+        self.__publish(None)
+
+
+    def __publish(self, title):
+        self.snapshot = self.dataset.snapshot()
+
+        if self.snapshot.num_chunks != 0:
+            self.__callback((self.map_index, self.snapshot, title))
+
+
+    def __save_data(self, data):
+        if isinstance(self.dataset, type(None)):
+            self.__new_file()
+
+        if data.shape[0] == 0:
+            return
+
+        # Written as a new chunk at the end of the file; nothing already recorded is touched.
+        # Release offsets, note intervals and hold states go into the features sidecar.
+        self.dataset.append(Data.to_records(data), **Data.get_play_info(data), features=NoteFeatures.get_features(data))
+
+
+    def __index_maps(self):
+        try: self.__check_maps_db()
+        finally:
+            # Even if the index could not be updated, whatever it holds is used
+            with self.__ingest_lock:
+                self.__recover_journal()
+
+            self.ingest_queue.resume()
+
+            # From here on maps are kept up to date file by file, without going
+            # through osu!.db
+            self.monitor.create_map_monitor('Map Indexer', self.__handle_map_change, f'{self.osu_path}/Songs')
+
+
+    def __recover_journal(self):
+        '''
+        Finishes replays that were being ingested when the app last closed
+        '''
+        entries = self.journal.get_pending()
+        if len(entries) == 0:
+            return
+
+        print(f'Recovering {len(entries)} unfinished replays...')
+
+        for entry in entries:
+            if not os.path.exists(entry['recording']):
+                self.journal.abort(entry['hash'])
+                continue
+
+            write_file = None if isinstance(self.dataset, type(None)) else self.dataset.write_file
+
+            if not isinstance(write_file, type(None)) and (os.path.abspath(write_file.file_pathname) == entry['recording']):
+                num_chunks = write_file.num_chunks
+            else:
+                # Looked at on its own, so whatever has been opened since is left as it is.
+                # Opening it to write drops the partial play if the append did not finish.
+                recording  = RecordingFile(entry['recording'])
+                num_chunks = recording.num_chunks
+                recording.close()
+
+            # Play made it into the recording, but the commit didn't make it into the journal
+            if num_chunks > entry['num_chunks']:
+                self.journal.commit(entry['hash'])
+                self.seen_replays.add(entry['hash'])
+                continue
+
+            self.journal.abort(entry['hash'])
+            if os.path.exists(entry['replay']):
+                self.__record_replay(entry['replay'])
+
+
+    def __handle_new_replay(self, replay_path):
+        # The monitor only calls this once osu! is done writing the replay
+        #print('New replay detected!')
+
+        self.ingest_queue.put(replay_path)
+
+
+    def __handle_map_change(self, map_path):
+        path = os.path.relpath(map_path, f'{self.osu_path}/Songs').replace('\\', '/')
+
+        if not os.path.exists(map_path):
+            if self.map_index.remove_file(path):
+                print(f'Map removed: {path}')
+            return
+
+        md5 = IngestJournal.get_file_hash(map_path)
+        last_modified = int(os.path.getmtime(map_path)*Recorder.TICKS_PER_SECOND) + Recorder.TICKS_UNIX_EPOCH
+
+        if self.map_index.update_file(md5, path, last_modified):
+            print(f'Map updated: {path}')
+
+
+    def __record_replay(self, replay_path):
+        with self.__ingest_lock:
+            # The same replay can be reported more than once, or come back under another
+            # name when re-exported. Reading and hashing it is cheap next to parsing and scoring.
+            replay_hash = IngestJournal.get_file_hash(replay_path)
+            if replay_hash in self.seen_replays:
+                print(f'Replay "{os.path.basename(replay_path)}" is already recorded')
+                return
+
+            if isinstance(self.dataset, type(None)):
+                self.__new_file()
+
+            if isinstance(self.dataset.write_file, type(None)):
+                # Only recordings to read from are open, the play goes in with them
+                self.__new_session()
+                self.__open(self.__pathnames)
+
+            self.journal.begin(replay_hash, replay_path, self.dataset.write_file)
+
+            try: title = self.__ingest_replay(replay_path)
+            except Exception:
+                self.journal.abort(replay_hash)
+                raise
+
+            if isinstance(title, type(None)):
+                self.journal.abort(replay_hash)
+                return
+
+            self.journal.commit(replay_hash)
+            self.seen_replays.add(replay_hash)
+            self.__publish(title)
+
+
+    def __ingest_replay(self, replay_path):
+        result = self.processor.process(replay_path)
+        if isinstance(result, type(None)):
+            return
+
+        data, title = result
+        self.__save_data(data)
+
+        return title
+
+
+    def __check_maps_db(self):
+        counts = self.map_index.sync(f'{self.osu_path}/osu!.db', progress=self.__progress_callback)
+        if isinstance(counts, type(None)):
+            return
+
+        num_inserts, num_deletes, num_moves = counts
+        print(f'Map index updated: {num_inserts} added, {num_deletes} removed, {num_moves} moved or modified')
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Records mania replays and computes per-map statistics without the GUI')
+    jobs = parser.add_subparsers(dest='job', required=True)
+
+    watch = jobs.add_parser('watch', help='records replays as osu! saves them, until interrupted')
+    watch.add_argument('osu_path', help='osu! folder')
+    watch.add_argument('-r', '--recordings', nargs='+', default=None, help='recording files or folders to open along with the new recording, read-only (default: none)')
+
+    stats = jobs.add_parser('stats', help='writes per-map statistics of recordings as CSV')
+    stats.add_argument('inputs', nargs='+', help='recording files or folders')
+    stats.add_argument('-o', '--output', default=None, help='CSV file to write (default: stdout)')
+    stats.add_argument('--maps', default='data/maps.db', help='map index for map names (default: data/maps.db)')
+    args = parser.parse_args()
+
+    if args.job == 'watch':
+        def on_replay(args):
+            map_index, dataset, title = args
+            if not isinstance(title, type(None)):
+                print(f'Recorded "{title}" ({dataset.num_chunks} plays)')
+
+        def on_progress(num_read, num_total):
+            if num_read == num_total:
+                print(f'Indexed {num_total} maps')
+
+        recorder = Recorder(args.osu_path, on_replay, on_progress)
+        if not isinstance(args.recordings, type(None)):
+            recorder.open_files(args.recordings)
+
+        print(f'Watching "{args.osu_path}/data/r" for replays, Ctrl+C to stop')
+
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            recorder.close()
+
+    if args.job == 'stats':
+        dataset   = RecordingSet.open(args.inputs)
+        map_index = MapIndex(args.maps) if os.path.exists(args.maps) else None
+
+        try:
+            map_stats = MapStats.get_stats(dataset, map_index)
+
+            if isinstance(args.output, type(None)):
+                MapStats.write_csv(map_stats, sys.stdout)
+            else:
+                with open(args.output, 'w', newline='') as f:
+                    MapStats.write_csv(map_stats, f)
+        finally:
+            dataset.close()
+            if not isinstance(map_index, type(None)):
+                map_index.close()
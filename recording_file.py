@@ -0,0 +1,887 @@
+import os
+import ast
+import glob
+import mmap
+import struct
+
+import numpy as np
+from numpy.lib import format as npy_format
+
+from osu_analysis import ManiaScoreData
+
+
+
+class Data():
+    '''
+    Column layout of the float64 arrays the graphs work with
+    '''
+    MAP_ID    = 0
+    TIMESTAMP = 1
+    TIMINGS   = 2
+    OFFSETS   = 3
+    HIT_TYPE  = 4
+    KEYS      = 5
+    HASH      = 6
+    MODS      = 7
+    NUM_COLS  = 8
+
+    # On disk a row only holds what changes from note to note. Map id, timestamp,
+    # hash and mods are the same for the whole play and are kept in the chunk header.
+    RECORD_DTYPE = np.dtype([
+        ('timings',  np.float32),
+        ('offsets',  np.float32),
+        ('hit_type', np.int8),
+        ('keys',     np.uint8),
+    ])
+
+    # Per-play index of a selection. Rows of a play are contiguous, so a play is
+    # data[start:end]. Plays are ordered by timestamp - first play is plays[0],
+    # latest is plays[-1].
+    PLAYS_DTYPE = np.dtype([
+        ('timestamp', np.float64),
+        ('start',     np.int64),
+        ('end',       np.int64),
+        ('num_notes', np.int64),  # Press hits and misses
+    ])
+
+    # Names and types of the columns outside of the app, in column order. Per-play
+    # fields get the types they have in the chunk header.
+    COLUMNS_DTYPE = np.dtype([
+        ('map_id',    np.uint32),
+        ('timestamp', np.float64),
+        ('timings',   np.float32),
+        ('offsets',   np.float32),
+        ('hit_type',  np.int8),
+        ('keys',      np.uint8),
+        ('hash',      np.uint64),
+        ('mods',      np.uint32),
+    ])
+
+    @staticmethod
+    def is_note(hit_types):
+        return (hit_types == ManiaScoreData.TYPE_HITP) | (hit_types == ManiaScoreData.TYPE_MISSP)
+
+
+    @staticmethod
+    def to_records(data):
+        records = np.empty(data.shape[0], dtype=Data.RECORD_DTYPE)
+        records['timings']  = data[:, Data.TIMINGS]
+        records['offsets']  = data[:, Data.OFFSETS]
+        records['hit_type'] = data[:, Data.HIT_TYPE]
+        records['keys']     = data[:, Data.KEYS]
+        return records
+
+
+    @staticmethod
+    def get_play_info(data):
+        # All rows of a play share the same metadata
+        return {
+            'timestamp' : data[0, Data.TIMESTAMP],
+            'map_hash'  : int(data[0, Data.HASH]),
+            'mods'      : int(data[0, Data.MODS]),
+            'map_id'    : int(data[0, Data.MAP_ID]),
+        }
+
+
+    @staticmethod
+    def to_columns(records, chunk):
+        '''
+        Returns a play's rows as a dict of `COLUMNS_DTYPE` columns
+        '''
+        num_rows = records.shape[0]
+        return {
+            'map_id'    : np.full(num_rows, chunk['map_id'],    dtype=Data.COLUMNS_DTYPE['map_id']),
+            'timestamp' : np.full(num_rows, chunk['timestamp'], dtype=Data.COLUMNS_DTYPE['timestamp']),
+            'timings'   : records['timings'],
+            'offsets'   : records['offsets'],
+            'hit_type'  : records['hit_type'],
+            'keys'      : records['keys'],
+            'hash'      : np.full(num_rows, chunk['hash'],      dtype=Data.COLUMNS_DTYPE['hash']),
+            'mods'      : np.full(num_rows, chunk['mods'],      dtype=Data.COLUMNS_DTYPE['mods']),
+        }
+
+
+    @staticmethod
+    def from_plays(chunks, views):
+        # Chunks can come from different files, put them in play order
+        order  = np.argsort(chunks['timestamp'], kind='stable')
+        chunks = chunks[order]
+
+        records = np.concatenate([ views[idx] for idx in order ] + [ np.empty(0, dtype=Data.RECORD_DTYPE) ])
+
+        plays = np.empty(chunks.shape[0], dtype=Data.PLAYS_DTYPE)
+        plays['timestamp'] = chunks['timestamp']
+        plays['end']       = np.cumsum(chunks['num_rows'])
+        plays['start']     = plays['end'] - chunks['num_rows']
+        plays['num_notes'] = chunks['num_notes']
+
+        return Data.from_records(records, chunks), plays
+
+
+    @staticmethod
+    def from_records(records, chunks):
+        num_rows = chunks['num_rows']
+
+        data = np.empty((records.shape[0], Data.NUM_COLS))
+        data[:, Data.MAP_ID]    = np.repeat(chunks['map_id'], num_rows)
+        data[:, Data.TIMESTAMP] = np.repeat(chunks['timestamp'], num_rows)
+        data[:, Data.TIMINGS]   = records['timings']
+        data[:, Data.OFFSETS]   = records['offsets']
+        data[:, Data.HIT_TYPE]  = records['hit_type']
+        data[:, Data.KEYS]      = records['keys']
+        data[:, Data.HASH]      = np.repeat(chunks['hash'], num_rows)
+        data[:, Data.MODS]      = np.repeat(chunks['mods'], num_rows)
+        return data
+
+
+
+class NoteFeatures():
+    '''
+    Extra per-note data derived from a play, stored in a `.feat` sidecar next to the
+    recording. There is one row per note (press hit or miss), in the same order the
+    notes appear in the play's rows.
+    '''
+
+    MAX_KEYS = 18
+
+    DTYPE = np.dtype([
+        ('release_offset', np.float32),              # Offset of the note's release
+        ('ic',    np.float32, (MAX_KEYS,)),          # Interval from the note to the previous note of each column
+        ('ip',    np.float32, (MAX_KEYS,)),          # `ic` of the previous note in the note's column
+        ('holds', np.uint32),                        # Bit per column held down at the note's release
+    ])
+
+    @staticmethod
+    def get_pathname(file_pathname):
+        return f'{os.path.splitext(file_pathname)[0]}.feat'
+
+
+    @staticmethod
+    def get_features(data):
+        '''
+        Computes the features for one play's rows in the `Data` layout. Intervals are in
+        the same time scale as the offsets (adjusted for DT/HT).
+        '''
+        hit_types = data[:, Data.HIT_TYPE]
+        is_press  = Data.is_note(hit_types)
+        is_release = \
+            ((hit_types == ManiaScoreData.TYPE_HITR) | (hit_types == ManiaScoreData.TYPE_MISSR)) & \
+            np.isfinite(data[:, Data.TIMINGS] - data[:, Data.OFFSETS])
+
+        features = np.zeros(np.count_nonzero(is_press), dtype=NoteFeatures.DTYPE)
+        if features.shape[0] == 0:
+            return features
+
+        note_t  = (data[:, Data.TIMINGS] - data[:, Data.OFFSETS])
+        press_t = note_t[is_press]
+        press_c = data[is_press, Data.KEYS].astype(np.int64)
+        rel_t   = note_t[is_release]
+        rel_c   = data[is_release, Data.KEYS].astype(np.int64)
+        rel_off = data[is_release, Data.OFFSETS]
+
+        # Notes of all columns go into one sorted array of (column, time) keys so that
+        # every column can be looked up with a single searchsorted call
+        t_min = min(np.min(press_t), np.min(rel_t, initial=np.inf))
+        span  = max(np.max(press_t), np.max(rel_t, initial=-np.inf)) - t_min + 1
+        cols  = np.arange(NoteFeatures.MAX_KEYS)
+
+        note_keys   = press_c*span + (press_t - t_min)
+        press_order = np.argsort(note_keys, kind='stable')
+        press_keys  = note_keys[press_order]
+        press_start = np.searchsorted(press_keys, cols*span, side='left')
+
+        rel_keys  = rel_c*span + (rel_t - t_min)
+        rel_order = np.argsort(rel_keys, kind='stable')
+        rel_keys  = rel_keys[rel_order]
+        rel_start = np.searchsorted(rel_keys, cols*span, side='left')
+
+        # ic: for each note and each column, the last note strictly before it
+        queries  = cols[np.newaxis, :]*span + (press_t - t_min)[:, np.newaxis]
+        prev_idx = np.searchsorted(press_keys, queries, side='left') - 1
+        has_prev = prev_idx >= press_start[np.newaxis, :]
+
+        prev_t = press_t[press_order][np.maximum(prev_idx, 0)]
+        features['ic'] = np.where(has_prev, press_t[:, np.newaxis] - prev_t, np.inf)
+
+        # ip: ic of the previous note in the note's own column
+        own_prev = prev_idx[np.arange(press_c.shape[0]), press_c]
+        has_own  = has_prev[np.arange(press_c.shape[0]), press_c]
+        features['ip'] = np.where(has_own[:, np.newaxis], features['ic'][press_order[np.maximum(own_prev, 0)]], np.inf)
+
+        # The note's release is the first release in its column at or after the press
+        if rel_keys.shape[0] == 0:
+            features['release_offset'] = np.nan
+            return features
+
+        rel_idx = np.searchsorted(rel_keys, note_keys, side='left')
+        has_rel = (rel_idx < rel_keys.shape[0])
+        rel_idx = np.minimum(rel_idx, rel_keys.shape[0] - 1)
+        has_rel &= (rel_c[rel_order][rel_idx] == press_c)
+
+        release_t = rel_t[rel_order][rel_idx]
+        features['release_offset'] = np.where(has_rel, rel_off[rel_order][rel_idx], np.nan)
+
+        # A column is held if more of its notes were pressed than released by the release time
+        queries  = cols[np.newaxis, :]*span + (release_t - t_min)[:, np.newaxis]
+        presses  = np.searchsorted(press_keys, queries, side='right') - press_start[np.newaxis, :]
+        releases = np.searchsorted(rel_keys, queries, side='right') - rel_start[np.newaxis, :]
+        held     = ((presses - releases) > 0) & has_rel[:, np.newaxis]
+
+        features['holds'] = np.sum(held.astype(np.uint32) << cols.astype(np.uint32), axis=1)
+        return features
+
+
+
+class RecordingFile():
+    '''
+    Append-only chunked recording store.
+
+        [ header ][ chunk 0 ][ chunk 1 ] ... [ chunk n ][ footer ]
+
+    Each recorded play is written as its own chunk - a fixed size chunk header
+    followed by the raw rows. The footer records how many chunks there are and
+    where chunk data ends. Recording a play writes the new chunk over the old
+    footer and then a new footer, so the cost of an append does not depend on
+    how much is already in the file.
+
+    Rows are read through a read-only memory map of the file. Chunks come back as
+    zero-copy views, so only the pages of chunks that are actually looked at get
+    loaded.
+
+    A file opened `read_only` is never written to - not even to recover it after an
+    append that did not finish, as another process may be in the middle of that append.
+    Its partial chunk is just left out.
+
+    `snapshot` gives a read-only copy of the file as it is, with a map of its own that
+    stays readable after the file is closed.
+    '''
+
+    MAGIC   = b'\x93MNREC'
+    VERSION = 4
+
+    HEADER = struct.Struct('<6sHH')     # magic, version, descr len
+    CHUNK  = struct.Struct('<4sIdQII')  # magic, num rows, timestamp, map hash, mods, map id
+    FOOTER = struct.Struct('<4sIQ')     # magic, num chunks, data end
+
+    CHUNK_MAGIC  = b'CHNK'
+    FOOTER_MAGIC = b'MNFT'
+
+    # Plays converted or merged per footer write and sync
+    COPY_BATCH = 256
+
+    DIRECTORY_DTYPE = np.dtype([
+        ('offset',    np.uint64),  # File offset of the chunk's rows
+        ('num_rows',  np.uint32),
+        ('timestamp', np.float64),
+        ('hash',      np.uint64),
+        ('mods',      np.uint32),
+        ('map_id',    np.uint32),
+        ('num_notes', np.int64),   # Not stored on disk; -1 until the chunk's rows are first read
+    ])
+
+    def __init__(self, file_pathname, read_only=False):
+        self.file_pathname = file_pathname
+        self.read_only     = read_only
+        self.__file = open(file_pathname, 'rb' if read_only else 'rb+')
+
+        self.version, self.dtype, self.__data_start = RecordingFile.__read_header(self.__file)
+
+        self.__directory  = np.empty(64, dtype=RecordingFile.DIRECTORY_DTYPE)
+        self.__num_chunks = 0
+        self.__data_end   = self.__data_start
+
+        # (map hash | mods) -> chunk idxs of that map, in the order they were recorded
+        self.__map_index = {}
+
+        self.__mmap = None
+
+        self.__load_directory()
+
+
+    @staticmethod
+    def create(file_pathname, dtype):
+        dtype = np.dtype(dtype)
+        descr = repr({ 'descr' : npy_format.dtype_to_descr(dtype.base), 'shape' : dtype.shape })
+
+        # Pad header out so chunk data starts on a 16 byte boundary
+        header_len = RecordingFile.HEADER.size + len(descr) + 1
+        descr += ' '*(-header_len % 16) + '\n'
+
+        with open(file_pathname, 'wb') as f:
+            f.write(RecordingFile.HEADER.pack(RecordingFile.MAGIC, RecordingFile.VERSION, len(descr)))
+            f.write(descr.encode('latin1'))
+            f.write(RecordingFile.FOOTER.pack(RecordingFile.FOOTER_MAGIC, 0, f.tell()))
+
+        return RecordingFile(file_pathname)
+
+
+    @staticmethod
+    def upgrade(file_pathname):
+        '''
+        Converts v2 .npy recordings into a .rec file next to them. Returns the path of
+        the file to open.
+        '''
+        if os.path.splitext(file_pathname)[1] != '.npy':
+            return file_pathname
+
+        new_pathname = f'{os.path.splitext(file_pathname)[0]}.rec'
+        if os.path.exists(new_pathname):
+            return new_pathname
+
+        plays = RecordingFile.__read_v2_plays(file_pathname)
+
+        print(f'Converting "{file_pathname}" to the v{RecordingFile.VERSION} record format...')
+
+        # Older recordings have no features sidecar, the features are made as plays are converted
+        features_pathname = NoteFeatures.get_pathname(new_pathname)
+
+        data_file    = RecordingFile.create(f'{new_pathname}.tmp', Data.RECORD_DTYPE)
+        feature_file = RecordingFile.create(f'{features_pathname}.tmp', NoteFeatures.DTYPE)
+        RecordingFile.__write_plays(RecordingSet([ data_file ], data_file, [ feature_file ]), plays)
+        data_file.close()
+        feature_file.close()
+
+        os.replace(f'{features_pathname}.tmp', features_pathname)
+        os.replace(f'{new_pathname}.tmp', new_pathname)
+        return new_pathname
+
+
+    @staticmethod
+    def __write_plays(dataset, plays):
+        batch = []
+
+        for play in plays:
+            if play.shape[0] == 0:
+                continue
+
+            batch.append(dict(rows=Data.to_records(play), features=NoteFeatures.get_features(play), **Data.get_play_info(play)))
+            if len(batch) == RecordingFile.COPY_BATCH:
+                dataset.append_many(batch)
+                batch = []
+
+        if len(batch) != 0:
+            dataset.append_many(batch)
+
+
+    @staticmethod
+    def __read_v2_plays(file_pathname):
+        # v2 files have the newest play first, chunks are written oldest first
+        data = np.load(file_pathname, allow_pickle=False)
+        data = data[np.argsort(data[:, Data.TIMESTAMP], kind='stable')]
+
+        _, play_starts = np.unique(data[:, Data.TIMESTAMP], return_index=True)
+        return np.split(data, play_starts[1:])
+
+
+    @staticmethod
+    def merge(src_pathnames, dst_pathname):
+        '''
+        Merges recordings into one file. Chunks are grouped by map and ordered by
+        timestamp within each map, and plays found in more than one file are only
+        kept once. Rows are copied over one chunk at a time, so memory use does not
+        depend on how large the recordings are.
+
+        Features sidecars are merged along with the recordings. Plays that have no
+        features in their sidecar get them computed.
+
+        Returns the number of plays written and the number of duplicates dropped.
+        '''
+        if len(src_pathnames) == 0:
+            raise ValueError('No recordings to merge')
+
+        src_set   = RecordingSet.open(src_pathnames)
+        src_files = src_set.data_files
+
+        # Only the chunk directories are gathered up front
+        directory  = np.concatenate([ src_file.directory for src_file in src_files ])
+        file_idxs  = np.concatenate([ np.full(src_file.num_chunks, i) for i, src_file in enumerate(src_files) ])
+        chunk_idxs = np.concatenate([ np.arange(src_file.num_chunks) for src_file in src_files ])
+
+        map_keys = directory['hash'] | directory['mods'].astype(np.uint64)
+        order    = np.lexsort((directory['timestamp'], map_keys))
+
+        # The same play is the same map recorded at the same time
+        map_keys   = map_keys[order]
+        timestamps = directory['timestamp'][order]
+        num_rows   = directory['num_rows'][order]
+
+        is_dup = np.zeros(order.shape[0], dtype=bool)
+        is_dup[1:] = \
+            (map_keys[1:] == map_keys[:-1]) & \
+            (timestamps[1:] == timestamps[:-1]) & \
+            (num_rows[1:] == num_rows[:-1])
+
+        order = order[~is_dup]
+
+        # (map key, timestamp) -> features of the play, for each source
+        src_features = [ RecordingFile.__get_play_features(feature_file) for feature_file in src_set.feature_files ]
+
+        features_pathname = NoteFeatures.get_pathname(dst_pathname)
+
+        dst_file     = RecordingFile.create(f'{dst_pathname}.tmp', Data.RECORD_DTYPE)
+        dst_features = RecordingFile.create(f'{features_pathname}.tmp', NoteFeatures.DTYPE)
+        dst_set      = RecordingSet([ dst_file ], dst_file, [ dst_features ])
+
+        for start in range(0, order.shape[0], RecordingFile.COPY_BATCH):
+            dst_set.append_many([ RecordingFile.__copy_chunk(src_files[file_idxs[idx]], chunk_idxs[idx], src_features[file_idxs[idx]]) for idx in order[start : start + RecordingFile.COPY_BATCH] ])
+
+        dst_set.close()
+        src_set.close()
+
+        os.replace(f'{features_pathname}.tmp', features_pathname)
+        os.replace(f'{dst_pathname}.tmp', dst_pathname)
+        return order.shape[0], int(np.count_nonzero(is_dup))
+
+
+    @staticmethod
+    def __get_play_features(feature_file):
+        # Chunk of each play in a features sidecar, by (map key, timestamp)
+        if isinstance(feature_file, type(None)):
+            return None, {}
+
+        keys = zip(feature_file.map_keys.tolist(), feature_file.directory['timestamp'].tolist())
+        return feature_file, { key : idx for idx, key in enumerate(keys) }
+
+
+    @staticmethod
+    def __copy_chunk(src_file, idx, src_features):
+        # As `RecordingSet.append_many` takes it. The rows and stored features are views
+        # of the sources' memory maps.
+        chunk = src_file.directory[idx]
+        rows  = src_file.read_chunk(idx)
+
+        feature_file, feature_idxs = src_features
+        feature_idx = feature_idxs.get((int(chunk['hash']) | int(chunk['mods']), float(chunk['timestamp'])), None)
+
+        features = None
+        if not isinstance(feature_idx, type(None)):
+            features = feature_file.read_chunk(feature_idx)
+
+        if isinstance(features, type(None)) or (features.shape[0] != np.count_nonzero(Data.is_note(rows['hit_type']))):
+            features = NoteFeatures.get_features(Data.from_records(rows, src_file.directory[idx : idx + 1]))
+
+        return dict(rows=rows, features=features, timestamp=chunk['timestamp'], map_hash=int(chunk['hash']), mods=int(chunk['mods']), map_id=int(chunk['map_id']))
+
+
+    @staticmethod
+    def __read_header(f):
+        f.seek(0)
+        magic, version, descr_len = RecordingFile.HEADER.unpack(f.read(RecordingFile.HEADER.size))
+
+        if magic != RecordingFile.MAGIC:
+            raise Exception(f'"{f.name}" is not a recording file!')
+
+        if version != RecordingFile.VERSION:
+            raise Exception(f'"{f.name}" has unsupported recording version {version}')
+
+        descr = ast.literal_eval(f.read(descr_len).decode('latin1'))
+        dtype = npy_format.descr_to_dtype(descr['descr'])
+        if len(descr['shape']) != 0:
+            dtype = np.dtype((dtype, descr['shape']))
+
+        return version, dtype, f.tell()
+
+
+    def __load_directory(self):
+        file_size = os.fstat(self.__file.fileno()).st_size
+
+        self.__file.seek(max(file_size - RecordingFile.FOOTER.size, 0))
+        footer = self.__file.read(RecordingFile.FOOTER.size)
+
+        num_chunks = None
+        if len(footer) == RecordingFile.FOOTER.size:
+            magic, num_chunks, data_end = RecordingFile.FOOTER.unpack(footer)
+            if magic != RecordingFile.FOOTER_MAGIC or data_end != file_size - RecordingFile.FOOTER.size:
+                num_chunks = None
+            else:
+                file_size = data_end
+
+        # Walk the chunk headers. Only the headers are read, never the rows.
+        pos = self.__data_start
+        while pos + RecordingFile.CHUNK.size <= file_size:
+            if num_chunks != None and self.__num_chunks == num_chunks:
+                break
+
+            self.__file.seek(pos)
+            magic, num_rows, timestamp, map_hash, mods, map_id = RecordingFile.CHUNK.unpack(self.__file.read(RecordingFile.CHUNK.size))
+
+            chunk_end = pos + RecordingFile.CHUNK.size + num_rows*self.dtype.itemsize
+            if magic != RecordingFile.CHUNK_MAGIC or chunk_end > file_size:
+                break
+
+            self.__add_chunk(pos + RecordingFile.CHUNK.size, num_rows, timestamp, map_hash, mods, map_id, -1)
+            pos = chunk_end
+
+        self.__data_end = pos
+
+        # The footer did not match what is on disk, meaning the last append did not
+        # finish. Drop whatever partial chunk is left and write a valid footer.
+        if self.read_only:
+            return
+
+        if num_chunks != self.__num_chunks:
+            print(f'Recording "{self.file_pathname}" was not closed properly - recovered {self.__num_chunks} plays')
+            self.__file.truncate(self.__data_end)
+            self.__write_footer()
+
+
+    def snapshot(self):
+        '''
+        Returns a read-only copy of the file with the chunks it has now. Chunks appended
+        after this are not in it. The copy maps the file itself, so closing this file
+        doesn't close it.
+        '''
+        snapshot = RecordingFile.__new__(RecordingFile)
+
+        snapshot.file_pathname = self.file_pathname
+        snapshot.read_only     = True
+        snapshot.version       = self.version
+        snapshot.dtype         = self.dtype
+
+        # Appends only ever go past the end of the directory, so the snapshot can read
+        # the same one. Chunk idxs of maps are filtered to the snapshot's chunks.
+        snapshot.__directory  = self.__directory[:self.__num_chunks]
+        snapshot.__num_chunks = self.__num_chunks
+        snapshot.__data_start = self.__data_start
+        snapshot.__data_end   = self.__data_end
+        snapshot.__map_index  = { map_key : idxs for map_key, idxs in self.__map_index.items() if idxs[0] < self.__num_chunks }
+
+        with open(self.file_pathname, 'rb') as f:
+            snapshot.__file = f
+            snapshot.__mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        return snapshot
+
+
+    def __get_mmap(self, end):
+        # The file only ever grows, so the map needs to be redone only when asked
+        # for data past what is mapped. Old maps stay alive for as long as views
+        # into them do.
+        if isinstance(self.__mmap, type(None)) or len(self.__mmap) < end:
+            self.__mmap = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        return self.__mmap
+
+
+    def __add_chunk(self, offset, num_rows, timestamp, map_hash, mods, map_id, num_notes):
+        if self.__num_chunks == self.__directory.shape[0]:
+            self.__directory = np.resize(self.__directory, self.__directory.shape[0]*2)
+
+        self.__directory[self.__num_chunks] = (offset, num_rows, timestamp, map_hash, mods, map_id, num_notes)
+        self.__map_index.setdefault(int(map_hash) | int(mods), []).append(self.__num_chunks)
+        self.__num_chunks += 1
+
+
+    def __write_footer(self):
+        self.__file.seek(self.__data_end)
+        self.__file.write(RecordingFile.FOOTER.pack(RecordingFile.FOOTER_MAGIC, self.__num_chunks, self.__data_end))
+        self.__file.flush()
+        os.fsync(self.__file.fileno())
+
+
+    @property
+    def num_chunks(self):
+        return self.__num_chunks
+
+
+    @property
+    def directory(self):
+        return self.__directory[:self.__num_chunks]
+
+
+    @property
+    def map_keys(self):
+        # Map hashes have the lower 16 bits clear, the mods go there
+        return self.directory['hash'] | self.directory['mods'].astype(np.uint64)
+
+
+    def append(self, rows, timestamp, map_hash, mods, map_id):
+        if self.read_only:
+            raise ValueError(f'"{self.file_pathname}" is opened read-only')
+
+        self.__write_chunk(rows, timestamp, map_hash, mods, map_id)
+        self.__write_footer()
+
+
+    def append_many(self, plays):
+        '''
+        Appends several plays, each a dict of `append`'s arguments. The footer is written
+        and synced once for all of them.
+        '''
+        if self.read_only:
+            raise ValueError(f'"{self.file_pathname}" is opened read-only')
+
+        for play in plays:
+            self.__write_chunk(play['rows'], play['timestamp'], play['map_hash'], play['mods'], play['map_id'])
+
+        self.__write_footer()
+
+
+    def __write_chunk(self, rows, timestamp, map_hash, mods, map_id):
+        rows = np.ascontiguousarray(rows, dtype=self.dtype.base)
+        if rows.shape[1:] != self.dtype.shape:
+            raise ValueError(f'Expected rows of shape {self.dtype.shape}, got {rows.shape[1:]}')
+
+        num_rows = rows.shape[0]
+
+        self.__file.seek(self.__data_end)
+        self.__file.write(RecordingFile.CHUNK.pack(RecordingFile.CHUNK_MAGIC, num_rows, timestamp, map_hash, mods, map_id))
+        self.__file.write(rows.tobytes())
+
+        num_notes = np.count_nonzero(Data.is_note(rows['hit_type'])) if rows.dtype == Data.RECORD_DTYPE else -1
+        self.__add_chunk(self.__data_end + RecordingFile.CHUNK.size, num_rows, timestamp, map_hash, mods, map_id, num_notes)
+        self.__data_end += RecordingFile.CHUNK.size + rows.nbytes
+
+
+    def read_chunk(self, idx):
+        chunk = self.directory[idx]
+
+        offset   = int(chunk['offset'])
+        num_rows = int(chunk['num_rows'])
+        if num_rows == 0:
+            return np.empty(0, dtype=self.dtype)
+
+        data = self.__get_mmap(offset + num_rows*self.dtype.itemsize)
+        return np.frombuffer(data, dtype=self.dtype, count=num_rows, offset=offset)
+
+
+    def get_maps(self):
+        return np.fromiter(self.__map_index.keys(), dtype=np.uint64, count=len(self.__map_index))
+
+
+    def get_map_chunks(self, map_key):
+        # A snapshot shares the idx lists of the file it was taken from, which may have
+        # had chunks appended since
+        idxs = np.asarray(self.__map_index.get(int(map_key), []), dtype=np.int64)
+        return idxs[idxs < self.__num_chunks]
+
+
+    def get_map_plays(self, map_key):
+        '''
+        Returns the directory entries of the map's chunks and zero-copy views of their rows
+        '''
+        idxs  = self.get_map_chunks(map_key)
+        views = [ self.read_chunk(idx) for idx in idxs ]
+
+        # Note counts of chunks recorded before this file was opened are only
+        # known once their rows are looked at
+        if self.dtype != Data.RECORD_DTYPE:
+            return self.directory[idxs], views
+
+        for idx, view in zip(idxs, views):
+            if self.__directory['num_notes'][idx] < 0:
+                self.__directory['num_notes'][idx] = np.count_nonzero(Data.is_note(view['hit_type']))
+
+        return self.directory[idxs], views
+
+
+    def select(self, map_key):
+        '''
+        Returns the selected map's rows in the `Data` layout, ordered by play, and
+        the play index (`Data.PLAYS_DTYPE`) for those rows.
+        '''
+        # Only the chunks of the selected map get paged in and copied
+        return Data.from_plays(*self.get_map_plays(map_key))
+
+
+    def close(self):
+        self.__mmap = None
+
+        if not self.__file.closed:
+            self.__file.close()
+
+
+
+class RecordingSet():
+    '''
+    Several recordings opened as one. Nothing is concatenated up front - selecting
+    a map only reads that map's chunks out of each file. New plays are appended to
+    `write_file`, the only file of the set that's written to. A set without one is
+    read-only.
+
+    Each recording can have a `.feat` sidecar holding the plays' `NoteFeatures`.
+    Plays with no features in the sidecar get them computed when selected.
+
+    `snapshot` gives a read-only set that stays as the set was when it was taken,
+    for reading from another thread while plays keep being recorded.
+    '''
+
+    def __init__(self, data_files, write_file=None, feature_files=None):
+        self.data_files = data_files
+        self.__write_file = write_file
+
+        if isinstance(feature_files, type(None)):
+            feature_files = [ RecordingSet.__open_features(data_file) for data_file in data_files ]
+
+        self.feature_files = feature_files
+
+
+    @staticmethod
+    def open(pathnames, write_pathname=None):
+        '''
+        Opens recordings, or folders of them, read-only. If `write_pathname` is given, that
+        recording is opened to record to - it's created if it doesn't exist, and added to
+        the set if it isn't among `pathnames`.
+        '''
+        file_pathnames = RecordingSet.find_recordings(pathnames)
+
+        if not isinstance(write_pathname, type(None)):
+            write_pathname = os.path.abspath(write_pathname)
+            if not os.path.exists(write_pathname):
+                RecordingFile.create(write_pathname, Data.RECORD_DTYPE).close()
+
+            if write_pathname not in file_pathnames:
+                file_pathnames.append(write_pathname)
+
+        data_files = [ RecordingFile(file_pathname, read_only=(file_pathname != write_pathname)) for file_pathname in file_pathnames ]
+        write_file = None if isinstance(write_pathname, type(None)) else data_files[file_pathnames.index(write_pathname)]
+
+        return RecordingSet(data_files, write_file)
+
+
+    @staticmethod
+    def find_recordings(pathnames):
+        '''
+        Expands folders into the recordings inside them and converts older recordings
+        to the current format. Returns the paths of the recordings to open.
+        '''
+        file_pathnames = []
+        for pathname in pathnames:
+            if not os.path.isdir(pathname):
+                file_pathnames.append(pathname)
+                continue
+
+            file_pathnames += sorted(glob.glob(f'{pathname}/*.rec') + glob.glob(f'{pathname}/*.npy'))
+
+        # A v2 .npy recording and the .rec converted from it are the same recording
+        file_pathnames = [ RecordingFile.upgrade(file_pathname) for file_pathname in file_pathnames ]
+        file_pathnames = list(dict.fromkeys([ os.path.abspath(file_pathname) for file_pathname in file_pathnames ]))
+
+        return file_pathnames
+
+
+    @staticmethod
+    def __open_features(data_file):
+        file_pathname = NoteFeatures.get_pathname(data_file.file_pathname)
+        if not os.path.exists(file_pathname):
+            return None
+
+        return RecordingFile(file_pathname, read_only=data_file.read_only)
+
+
+    @property
+    def num_chunks(self):
+        return sum([ data_file.num_chunks for data_file in self.data_files ])
+
+
+    def snapshot(self):
+        '''
+        Returns a read-only copy of the set as it is now. Plays recorded after this are
+        not in it. The snapshot has its own maps of the files, so it can still be read
+        after this set is closed.
+        '''
+        data_files    = [ data_file.snapshot() for data_file in self.data_files ]
+        feature_files = [ None if isinstance(feature_file, type(None)) else feature_file.snapshot() for feature_file in self.feature_files ]
+
+        return RecordingSet(data_files, None, feature_files)
+
+
+    @property
+    def write_file(self):
+        # New plays go into this file, None if the set is read-only
+        return self.__write_file
+
+
+    def __get_write_features(self):
+        # The features sidecar of the write file, made when first needed
+        idx = self.data_files.index(self.__write_file)
+        if isinstance(self.feature_files[idx], type(None)):
+            self.feature_files[idx] = RecordingFile.create(NoteFeatures.get_pathname(self.__write_file.file_pathname), NoteFeatures.DTYPE)
+
+        return self.feature_files[idx]
+
+
+    def append(self, rows, timestamp, map_hash, mods, map_id, features=None):
+        if isinstance(self.__write_file, type(None)):
+            raise ValueError('The recordings are opened read-only')
+
+        self.write_file.append(rows, timestamp, map_hash, mods, map_id)
+
+        if isinstance(features, type(None)):
+            return
+
+        self.__get_write_features().append(features, timestamp, map_hash, mods, map_id)
+
+
+    def append_many(self, plays):
+        '''
+        Appends several plays, each a dict of `append`'s arguments, `features` included
+        '''
+        if isinstance(self.__write_file, type(None)):
+            raise ValueError('The recordings are opened read-only')
+
+        self.write_file.append_many(plays)
+
+        plays = [ play for play in plays if not isinstance(play.get('features', None), type(None)) ]
+        if len(plays) == 0:
+            return
+
+        self.__get_write_features().append_many([ dict(play, rows=play['features']) for play in plays ])
+
+
+    def get_maps(self):
+        maps = [ data_file.get_maps() for data_file in self.data_files ]
+        return np.unique(np.concatenate(maps + [ np.empty(0, dtype=np.uint64) ]))
+
+
+    def select(self, map_key):
+        chunks = []
+        views  = []
+
+        for data_file in self.data_files:
+            file_chunks, file_views = data_file.get_map_plays(map_key)
+            chunks.append(file_chunks)
+            views += file_views
+
+        chunks = np.concatenate(chunks + [ np.empty(0, dtype=RecordingFile.DIRECTORY_DTYPE) ])
+
+        # A play can be in more than one file, e.g. in a session and in a merge of it. As
+        # in `merge`, the same play is the same map recorded at the same time.
+        _, keep = np.unique(np.column_stack((chunks['timestamp'], chunks['num_rows'])), axis=0, return_index=True)
+        keep = np.sort(keep)
+
+        return Data.from_plays(chunks[keep], [ views[idx] for idx in keep ])
+
+
+    def get_features(self, map_key, data, plays, play_idxs=None):
+        '''
+        Returns the `NoteFeatures` of a selection made with `select`, one row per note
+        in the order of the selection's notes. Only the plays at `play_idxs` are looked
+        at if given.
+        '''
+        if not isinstance(play_idxs, type(None)):
+            plays = plays[play_idxs]
+
+        stored = {}
+        for feature_file in self.feature_files:
+            if isinstance(feature_file, type(None)):
+                continue
+
+            file_chunks, file_views = feature_file.get_map_plays(map_key)
+            stored.update(zip(file_chunks['timestamp'], file_views))
+
+        features = []
+        for play in plays:
+            play_features = stored.get(play['timestamp'], None)
+            if isinstance(play_features, type(None)) or (play_features.shape[0] != play['num_notes']):
+                play_features = NoteFeatures.get_features(data[play['start']:play['end']])
+
+            features.append(play_features)
+
+        return np.concatenate(features + [ np.empty(0, dtype=NoteFeatures.DTYPE) ])
+
+
+    def close(self):
+        for data_file in self.data_files + self.feature_files:
+            if not isinstance(data_file, type(None)):
+                data_file.close()
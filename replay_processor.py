@@ -0,0 +1,136 @@
+import time
+
+import numpy as np
+
+from osu_analysis import ManiaActionData, ManiaScoreData
+from osu_analysis import Replay, BeatmapIO, ReplayIO, Gamemode
+
+from recording_file import Data
+
+
+
+class ReplayProcessor():
+    '''
+    Turns a replay into recording rows (`Data` layout): finds the replay's map, scores
+    the replay against it, and lays the scores out in columns. There is nothing Qt in
+    here, so it can run in worker processes.
+
+    `map_index` is anything with a `get_path(md5)`, usually a `MapIndex`.
+    '''
+
+    def __init__(self, osu_path, map_index, beatmap_cache):
+        self.osu_path      = osu_path
+        self.map_index     = map_index
+        self.beatmap_cache = beatmap_cache
+
+
+    def process(self, replay_path, timestamp=None):
+        '''
+        Returns the play's rows and a title for it, or None if the replay can't be used.
+        Rows are timestamped `timestamp`, or now if not given.
+        '''
+        try: replay, map_data, beatmap_meta, hash = self.get_files(replay_path)
+        except TypeError: return
+
+        replay_data = ManiaActionData.get_action_data(replay)
+        mods = ReplayProcessor.process_mods(map_data, replay_data, replay)
+
+        score_data = ManiaScoreData.get_score_data(map_data, replay_data)
+
+        # Get data
+        data = ReplayProcessor.get_data(hash, mods, beatmap_meta['cs'], map_data, score_data, beatmap_meta['beatmap_id'], timestamp)
+        return data, beatmap_meta['name'] + ' ' + replay.get_name()
+
+
+    def get_files(self, replay_path):
+        try: replay = ReplayIO.open_replay(replay_path)
+        except Exception as e:
+            print(f'Error opening replay: {e}')
+            return
+
+        if replay.game_mode != Gamemode.MANIA:
+            print('Only mania gamemode supported for now')
+            return
+
+        print('Determining beatmap...')
+
+        path = self.map_index.get_path(replay.beatmap_hash)
+        if isinstance(path, type(None)):
+            print('Associated beatmap not found. Do you have it?')
+            return
+
+        beatmap_pathname = f'{self.osu_path}/Songs/{path}'
+
+        # Playing the same map over and over is the common case, so its parsed data is cached
+        cached = self.beatmap_cache.get(replay.beatmap_hash, beatmap_pathname)
+        if not isinstance(cached, type(None)):
+            map_data, beatmap_meta = cached
+            return replay, map_data, beatmap_meta, replay.beatmap_hash
+
+        beatmap  = BeatmapIO.open_beatmap(beatmap_pathname)
+        map_data = ManiaActionData.get_action_data(beatmap)
+        beatmap_meta = {
+            'cs'         : beatmap.difficulty.cs,
+            'beatmap_id' : beatmap.metadata.beatmap_id,
+            'name'       : beatmap.metadata.name,
+        }
+
+        self.beatmap_cache.put(replay.beatmap_hash, beatmap_pathname, map_data, beatmap_meta)
+        return replay, map_data.copy(), beatmap_meta, replay.beatmap_hash
+
+
+    @staticmethod
+    def get_data(md5, mods, num_keys, map_data, score_data, beatmap_id, timestamp=None):
+        '''
+        Returns the play's rows in `Data` column layout, ordered by key column
+        and by score order within a column
+        '''
+        current_time = time.time() if isinstance(timestamp, type(None)) else timestamp
+        hash_mask = 0xFFFFFFFFFFFF0000
+
+        # Whole frame at once - first index level is the key column
+        cols     = score_data.index.get_level_values(0).values
+        replay_t = score_data['replay_t'].values
+        map_t    = score_data['map_t'].values
+        htypes   = score_data['type'].values
+
+        # Stable, so each column's scores keep their order
+        order = np.argsort(cols, kind='stable')
+        order = order[(cols[order] >= 0) & (cols[order] < int(num_keys))]
+
+        data = np.empty((order.shape[0], Data.NUM_COLS), dtype=np.float64)
+        data[:, Data.TIMINGS] = replay_t[order]
+        data[:, Data.OFFSETS] = replay_t[order] - map_t[order]
+
+        if mods & (1 << 0):    # DT
+            data[:, Data.TIMINGS] /= 1.5
+            data[:, Data.OFFSETS] *= 2/3
+        elif mods & (1 << 1):  # HT
+            data[:, Data.TIMINGS] *= 1.5
+            data[:, Data.OFFSETS] *= 3/2
+
+        data[:, Data.HIT_TYPE]  = htypes[order]
+        data[:, Data.KEYS]      = cols[order]
+        data[:, Data.MAP_ID]    = beatmap_id
+        data[:, Data.TIMESTAMP] = current_time
+        data[:, Data.HASH]      = int(md5, 16) & hash_mask
+        data[:, Data.MODS]      = mods
+
+        return data
+
+
+    @staticmethod
+    def process_mods(map_data, replay_data, replay: Replay):
+        mods = 0
+
+        if replay.mods.has_mod('DT') or replay.mods.has_mod('NC'):
+            mods |= (1 << 0)
+
+        if replay.mods.has_mod('HT'):
+            mods |= (1 << 1)
+
+        if replay.mods.has_mod('MR'):
+            num_keys = ManiaActionData.num_keys(map_data)
+            map_data[:, ManiaActionData.IDX_COL] = (num_keys - 1) - map_data[:, ManiaActionData.IDX_COL]
+
+        return mods
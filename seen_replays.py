@@ -0,0 +1,50 @@
+import os
+
+
+
+class SeenReplays():
+    '''
+    Persistent set of the content hashes of replays that are in the recordings.
+    The file is one hash per line and is only ever appended to.
+    '''
+
+    def __init__(self, file_pathname):
+        self.file_pathname = file_pathname
+        self.__hashes = set()
+
+        if os.path.exists(file_pathname):
+            with open(file_pathname, 'r') as f:
+                # A torn last line is not a full hash and won't match anything
+                self.__hashes = set(line.strip() for line in f)
+
+        self.__file = open(file_pathname, 'a')
+
+
+    def __contains__(self, replay_hash):
+        return replay_hash in self.__hashes
+
+
+    def __len__(self):
+        return len(self.__hashes)
+
+
+    def add(self, replay_hash):
+        self.add_many([ replay_hash ])
+
+
+    def add_many(self, replay_hashes):
+        replay_hashes = [ replay_hash for replay_hash in replay_hashes if replay_hash not in self.__hashes ]
+        if len(replay_hashes) == 0:
+            return
+
+        # Start on a new line in case the last write was torn
+        self.__file.write('\n' + '\n'.join(replay_hashes))
+        self.__file.flush()
+        os.fsync(self.__file.fileno())
+
+        self.__hashes.update(replay_hashes)
+
+
+    def close(self):
+        if not self.__file.closed:
+            self.__file.close()